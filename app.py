@@ -1,37 +1,86 @@
-"""ChatFreeGPT - Flask API Server with Task Automation."""
+"""ChatFreeGPT - async (ASGI) API Server with Task Automation."""
 
-import json
+import asyncio
 import os
 import re
-from flask import Flask, request, jsonify, Response, stream_with_context
-from flask_cors import CORS
+import time
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
 from dotenv import load_dotenv
 from main import (
-    process_query, process_query_stream, clear_conversation,
-    list_models, remove_task_markers, web_search, web_search_images
+    process_query_stream, clear_conversation, ModelError,
+    list_models, web_search, web_search_images, search_cache
+)
+from events import event_stream
+from generations import generations
+from history_cache import HistoryCache, clean_message
+from intent import classify
+from model_manager import ModelManager
+from ollama_pool import pool
+from query_rewrite import QueryRewriter
+from response_cache import ResponseCache, replay
+from retrieval import RETRIEVAL, retrieve, format_passages, page_cache
+from scheduler import scheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from search_need import SearchNeedClassifier
+from speculation import Speculation, content_words, stats as speculation_stats
+from storage import ConversationStore, ConflictError, migrate_from_json
+from summarizer import Summarizer
+from tasks import (
+    YouTubeTask, GmailTask, BrowserTask, SearchTask, execute_tasks, find_first_video_async,
+    video_cache
 )
-from tasks import YouTubeTask, GmailTask, BrowserTask, SearchTask, find_first_video
-import ollama
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 # Enable CORS for React frontend
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],
-        "methods": ["GET", "POST", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
-    }
-})
+app = cors(
+    app,
+    allow_origin=["http://localhost:5173", "http://127.0.0.1:5173"],
+    allow_methods=["GET", "POST", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "If-Match", "If-None-Match"],
+    expose_headers=["ETag", "Retry-After"],
+)
 
 # Default model
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "llama3.2")
 
-# Conversations storage
-conversations = {}
+# Loads DEFAULT_MODEL (and WARM_MODELS) at startup and keeps them loaded
+model_manager = ModelManager(DEFAULT_MODEL)
+
+# Most stored messages considered for context; the token budget trims further
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", 200))
+
+# Per-source deadlines (seconds) for lookups made while answering a message
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 6))
+IMAGE_SEARCH_TIMEOUT = float(os.getenv("IMAGE_SEARCH_TIMEOUT", 6))
+VIDEO_LOOKUP_TIMEOUT = float(os.getenv("VIDEO_LOOKUP_TIMEOUT", 8))
+
+# Look up a video in the background when a message might be about music or
+# videos without clearly asking to play something; the result is only sent
+# if the answer then suggests a YouTube video
+VIDEO_SPECULATION = os.getenv("VIDEO_SPECULATION", "true").lower() == "true"
+_VIDEO_WORDS = frozenset(
+    "music song songs video videos clip clips playlist playlists album albums youtube".split()
+)
+# Terms where a media word names something else, so they don't count
+_VIDEO_COMPOUNDS = frozenset((word, following) for word, rest in {
+    'video': "codec codecs card cards game games call calls chat conferencing conference driver "
+             "drivers memory ram encoding encoder editor editing editors format formats resolution "
+             "compression bitrate output input port cable camera cameras doorbell",
+    'videos': "codec codecs",
+    'music': "box boxes theory industry school schools stand stands production producer "
+             "software license licensing licence copyright stocks",
+    'song': "structure form",
+    'album': "cover art",
+    'youtube': "api algorithm algorithms premium tv studio revenue monetization",
+}.items() for following in rest.split())
+
+# Seconds each task in /api/execute-tasks may take, and the most tasks per batch
+TASK_TIMEOUT = float(os.getenv("TASK_TIMEOUT", 10))
+TASK_BATCH_MAX = int(os.getenv("TASK_BATCH_MAX", 20))
 
 # Task handlers
 task_handlers = {
@@ -41,119 +90,119 @@ task_handlers = {
     'open': BrowserTask(),
 }
 
-# Conversations file path
+# Conversations storage (legacy JSON file is migrated into the database once)
 CONVERSATIONS_FILE = os.path.join(os.path.dirname(__file__), 'conversations.json')
+CONVERSATIONS_DB = os.getenv(
+    "CONVERSATIONS_DB", os.path.join(os.path.dirname(__file__), 'conversations.db')
+)
+store = ConversationStore(CONVERSATIONS_DB)
+summarizer = Summarizer(store)
+
+# Cleaned recent messages per conversation, so chat requests need not send history
+history_cache = HistoryCache(store, summarizer, HISTORY_MAX_MESSAGES)
+
+# Answers to first messages, reused when RESPONSE_CACHE=true
+response_cache = ResponseCache()
+
+# Decides which messages in search mode need a web search
+search_need = SearchNeedClassifier()
+
+# Turns follow-ups into self-contained search queries, per conversation
+query_rewriter = QueryRewriter()
 
 
 def load_conversations():
-    """Load conversations from file."""
-    global conversations
+    """Migrate the legacy conversations.json into the store if it is still around."""
     try:
-        if os.path.exists(CONVERSATIONS_FILE):
-            with open(CONVERSATIONS_FILE, 'r') as f:
-                conversations = json.load(f)
+        count = migrate_from_json(store, CONVERSATIONS_FILE)
+        if count:
+            print(f"Migrated {count} conversations from {CONVERSATIONS_FILE}")
     except Exception as e:
-        print(f"Error loading conversations: {e}")
-        conversations = {}
+        print(f"Error migrating conversations: {e}")
+
+
+class InvalidVersionError(ValueError):
+    """An If-Match header that isn't a version this server sent."""
 
 
-def save_conversations():
-    """Save conversations to file."""
+def expected_version():
+    """
+    Read the version a client expects from its If-Match header (None if absent).
+
+    Raises:
+        InvalidVersionError: If the header is not a version number; the
+            write must not go ahead unchecked
+    """
+    header = request.headers.get('If-Match', '').strip()
+    if not header or header == '*':
+        return None
     try:
-        with open(CONVERSATIONS_FILE, 'w') as f:
-            json.dump(conversations, f, indent=2)
-    except Exception as e:
-        print(f"Error saving conversations: {e}")
+        return int(header.removeprefix('W/').strip('"'))
+    except ValueError:
+        raise InvalidVersionError(f"Invalid If-Match header: {header}")
 
 
-def get_conversation_history(conversation_id):
-    """Get message history for a conversation, formatted for the AI."""
-    if not conversation_id or conversation_id not in conversations:
-        return []
+@app.errorhandler(InvalidVersionError)
+async def invalid_version_response(error):
+    """Build the 400 response for an unparseable If-Match header."""
+    return jsonify({'status': 'error', 'message': str(error)}), 400
+
 
-    convo = conversations[conversation_id]
-    messages = convo.get('messages', [])
+def conflict_response(error):
+    """Build the 412 response for a write against a stale version."""
+    response = jsonify({
+        'status': 'error',
+        'message': 'Conversation was modified elsewhere',
+        'version': error.current_version
+    })
+    response.headers['ETag'] = f'"{error.current_version}"'
+    return response, 412
 
-    return clean_message_history(messages)
 
+def queue_full_response(error):
+    """Build the 429 response for a model whose queue is full."""
+    response = jsonify({'status': 'error', 'message': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
 
-def clean_message_history(messages):
-    """Clean a list of messages for AI context (remove task markers, limit size)."""
-    history = []
-    for msg in messages[-20:]:  # Last 20 messages
-        role = msg.get('role', 'user')
-        content = msg.get('content', '')
-        if role == 'assistant':
-            content = remove_task_markers(content)
-        history.append({'role': role, 'content': content})
-    return history
-
-
-def build_search_query(user_input, history):
-    """Build a contextual search query from user input and conversation history.
 
-    If the user's message is vague (e.g. "is he a good singer"), combine it
-    with recent user messages to form a meaningful search query.
-    Only uses user messages to avoid polluting search with AI response text.
+async def get_conversation_history(conversation_id, history=None):
     """
-    # Only grab recent USER messages for context (skip assistant responses)
-    recent_user = [
-        msg.get('content', '')[:80]
-        for msg in (history[-6:] if history else [])
-        if msg.get('role') == 'user' and msg.get('content', '')
-    ]
-    # Take last 2 user messages as context (not the current one)
-    context = recent_user[-2:] if len(recent_user) > 0 else []
+    Get a conversation's context for the AI.
 
-    if context:
-        return ' '.join(context) + ' ' + user_input
-
-    return user_input
+    Stored conversations are read from the history cache. A client-sent
+    ``history`` is only used for messages outside any stored conversation.
 
+    Returns:
+        Tuple of (summary of older turns, cleaned message history after it,
+        position of the history's first message in the conversation)
+    """
+    if conversation_id:
+        # Reading the store can wait on SQLite locks; keep it off the event loop
+        return await asyncio.to_thread(history_cache.get, conversation_id)
+    history = history or []
+    return "", clean_message_history(history), max(len(history) - HISTORY_MAX_MESSAGES, 0)
 
-def should_fetch_images(query):
-    """Determine if a query would benefit from image results.
 
-    Returns True for queries about people, places, animals, products,
-    landmarks, etc. Returns False for abstract/conceptual questions.
+def clean_message_history(messages):
     """
-    q = query.lower().strip()
-
-    # Keywords that suggest visual content is useful
-    visual_keywords = [
-        'who is', 'who was', 'who were',
-        'show me', 'picture of', 'photo of', 'images of', 'look like', 'looks like',
-        'where is', 'where are',
-        'celebrity', 'actor', 'actress', 'singer', 'player', 'athlete',
-        'flag of', 'logo of', 'brand',
-        'mountain', 'beach', 'island',
-        'painting', 'artwork',
-    ]
+    Clean a list of messages for AI context (remove task markers, limit count).
 
-    # Keywords that suggest NO images needed (abstract/conceptual)
-    no_image_keywords = [
-        'what is', 'what are', 'how to', 'why', 'explain', 'define',
-        'difference between', 'meaning of', 'tutorial', 'guide',
-        'code', 'programming', 'error', 'bug', 'fix',
-        'best way', 'how can i', 'should i', 'help me',
-        'calculate', 'convert', 'translate',
-        'who are you', 'your name', 'your creator', 'who made you', 'who built you',
-        'create', 'generate', 'make me', 'draw', 'write',
-        'can you', 'do you', 'are you', 'tell me',
-    ]
+    Token-based trimming to the model's context happens when the prompt is built.
+    """
+    return [clean_message(msg) for msg in messages[-HISTORY_MAX_MESSAGES:]]
 
-    # Check no-image keywords first (higher priority)
-    for keyword in no_image_keywords:
-        if keyword in q:
-            return False
 
-    # Check visual keywords
-    for keyword in visual_keywords:
-        if keyword in q:
-            return True
+def build_search_query(user_input, history, conversation_id=None):
+    """Build a contextual search query from user input and conversation history.
 
-    # Default: no images for generic queries
-    return False
+    If the user's message refers back to an earlier one (e.g. "is he a good
+    singer"), the reference is replaced with the conversation's topic, taken
+    from user messages only to avoid polluting search with AI response text.
+    Queries are memoized per conversation, so repeated follow-ups reuse the
+    same search cache key.
+    """
+    return query_rewriter.rewrite(user_input, history, conversation_id)
 
 
 # Load conversations on startup
@@ -161,9 +210,9 @@ load_conversations()
 
 
 @app.route('/api/chat', methods=['POST'])
-def chat():
+async def chat():
     """Handle non-streaming chat requests."""
-    data = request.get_json()
+    data = await request.get_json()
     user_input = data.get('message', '')
     model = data.get('model', DEFAULT_MODEL)
     conversation_id = data.get('conversation_id')
@@ -171,93 +220,195 @@ def chat():
     if not user_input.strip():
         return jsonify({"error": "Please enter a message."}), 400
 
-    history = get_conversation_history(conversation_id)
-    response = process_query(user_input, model=model, history=history)
-    return jsonify({"response": response})
+    summary, history, history_start = await get_conversation_history(conversation_id)
+    cached, cache_key = await response_cache.lookup(model, user_input, history, summary)
+    if cached is not None:
+        return jsonify({"response": cached, "cached": True})
+
+    try:
+        async with scheduler.slot(model, PRIORITY_BATCH):
+            chunks = [
+                chunk async for chunk in response_cache.record(cache_key, process_query_stream(
+                    user_input, model=model, history=history, summary=summary,
+                    history_start=history_start
+                ))
+            ]
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except ModelError as e:
+        return jsonify({"response": f"Error: {e}"})
+    return jsonify({"response": ''.join(chunks)})
+
+
+async def with_deadline(awaitable, timeout, default=None):
+    """Await a lookup, returning ``default`` if it fails or misses its deadline."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except Exception:
+        return default
+
+
+def video_lookup(query):
+    """Start a background YouTube lookup for a search term (None for a URL)."""
+    if query.startswith(('http://', 'https://', 'www.')):
+        return None
+
+    async def lookup():
+        video_data = await with_deadline(find_first_video_async(query), VIDEO_LOOKUP_TIMEOUT)
+        if video_data:
+            video_data["query"] = query
+        return video_data
+
+    return asyncio.create_task(lookup())
+
+
+def start_video_lookup(user_input):
+    """Start a background YouTube lookup if the message asks to play something."""
+    yt_query = detect_youtube_request(user_input)
+    return video_lookup(yt_query) if yt_query else None
+
+
+def mentions_video(user_input):
+    """
+    Whether a message talks about music or videos themselves.
+
+    Words must appear whole ("watchdog" doesn't count) and not be part of
+    a term for something else ("video codec", "music box").
+    """
+    words = re.findall(r"[\w']+", user_input.lower())
+    for i, word in enumerate(words):
+        following = words[i + 1] if i + 1 < len(words) else None
+        if word in _VIDEO_WORDS and (word, following) not in _VIDEO_COMPOUNDS:
+            return True
+    return False
+
+
+def speculate_video(user_input):
+    """
+    Start a speculative YouTube lookup if the message might want a video.
+
+    Messages that ask to play something (``youtube_query``) are looked up
+    outright by ``start_video_lookup``; this covers ones that only mention
+    music or videos. The message's content and media words are the search
+    term, and the answer's YouTube task marker decides whether the result
+    is kept.
+    """
+    intent = classify(user_input)
+    if not VIDEO_SPECULATION or intent.youtube_query or not mentions_video(user_input):
+        return []
+    words = re.findall(r"[\w']+", user_input.lower())
+    query = ' '.join(dict.fromkeys(w for w in words if w in _VIDEO_WORDS or content_words(w)))[:100]
+    if not query:
+        return []
+    return [Speculation('youtube', 'video', query, video_lookup)]
+
+
+def stream_response(events):
+    """Wrap an async SSE frame generator in a streaming response with no time limit."""
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
 
 
 def detect_youtube_request(query):
     """Check if user wants to play a YouTube video and extract the search term."""
-    q = query.lower().strip()
-    youtube_patterns = [
-        r'play\s+(.+?)(?:\s+on\s+youtube)?$',
-        r'play\s+(.+?)(?:\s+on\s+yt)?$',
-        r'(?:open|watch|listen\s+to)\s+(.+?)(?:\s+on\s+youtube)?$',
-        r'youtube\s+(.+)',
-        r'(.+?)\s+on\s+youtube',
-    ]
-    for pattern in youtube_patterns:
-        match = re.search(pattern, q)
-        if match:
-            search_term = match.group(1).strip()
-            # Remove trailing "on youtube" / "on yt" if still present
-            search_term = re.sub(r'\s+on\s+(youtube|yt)$', '', search_term).strip()
-            if search_term:
-                return search_term
-    return None
+    return classify(query).youtube_query
 
 
 @app.route('/api/chat/stream', methods=['POST'])
-def chat_stream():
+async def chat_stream():
     """Handle streaming chat requests for real-time responses."""
-    data = request.get_json()
+    data = await request.get_json()
     user_input = data.get('message', '')
     model = data.get('model', DEFAULT_MODEL)
-    history = data.get('history', [])
+    conversation_id = data.get('conversation_id')
 
     if not user_input.strip():
         return jsonify({"error": "Please enter a message."}), 400
 
-    # Clean history (remove task markers from assistant messages)
-    clean_history = clean_message_history(history)
-
-    # Detect YouTube intent and search before streaming
-    video_data = None
-    yt_query = detect_youtube_request(user_input)
-    if yt_query:
-        video_data = find_first_video(yt_query)
-        if video_data:
-            video_data["query"] = yt_query
-
-    def generate():
-        try:
-            # Send video metadata as JSON prefix if found
-            if video_data:
-                prefix = json.dumps({"video": video_data})
-                yield prefix + "\n---STREAM---\n"
+    summary, clean_history, history_start = await get_conversation_history(
+        conversation_id, data.get('history')
+    )
 
-            for chunk in process_query_stream(user_input, model=model, history=clean_history):
-                yield chunk
-        except Exception as e:
-            yield f"Error: {str(e)}"
+    # A cached answer is replayed without taking a generation slot
+    cached, cache_key = await response_cache.lookup(model, user_input, clean_history, summary)
+    if cached is not None:
+        return stream_response(event_stream(
+            replay(cached),
+            lookups={"video": start_video_lookup(user_input)},
+            metadata={"cached": True},
+            handlers=task_handlers,
+            speculations=speculate_video(user_input)
+        ))
 
-    return Response(stream_with_context(generate()), mimetype='text/plain')
+    try:
+        ticket = scheduler.admit(model, PRIORITY_INTERACTIVE)
+    except QueueFullError as e:
+        return queue_full_response(e)
+
+    # Look up a YouTube video alongside generation; it is sent when it resolves
+    video_task = start_video_lookup(user_input)
+
+    return stream_response(event_stream(
+        response_cache.record(cache_key, process_query_stream(
+            user_input, model=model, history=clean_history, summary=summary,
+            history_start=history_start
+        )),
+        lookups={"video": video_task},
+        ticket=ticket,
+        model=model,
+        handlers=task_handlers,
+        speculations=speculate_video(user_input)
+    ))
 
 
 @app.route('/api/chat/search-stream', methods=['POST'])
-def chat_search_stream():
+async def chat_search_stream():
     """Handle chat with web search augmentation."""
-    data = request.get_json()
+    data = await request.get_json()
     user_input = data.get('message', '')
     model = data.get('model', DEFAULT_MODEL)
-    history = data.get('history', [])
+    conversation_id = data.get('conversation_id')
 
     if not user_input.strip():
         return jsonify({"error": "Please enter a message."}), 400
 
-    clean_history = clean_message_history(history)
+    summary, clean_history, history_start = await get_conversation_history(
+        conversation_id, data.get('history')
+    )
 
-    # Build a contextual search query using recent conversation context
-    search_query = build_search_query(user_input, clean_history)
+    # Small talk, writing/code tasks and other messages the model can answer
+    # on its own skip the search (and the wait for it) entirely
+    need = search_need.decide(user_input, clean_history)
+    search_query = build_search_query(user_input, clean_history, conversation_id) if need.search else ""
 
-    # Perform web search
-    search_results = web_search(search_query, max_results=5)
+    # Fan out text search, image search and YouTube lookup concurrently.
+    # DuckDuckGo has no async client, so its searches run in worker threads.
+    text_task = None
+    if need.search:
+        text_task = asyncio.create_task(with_deadline(
+            asyncio.to_thread(web_search, search_query, max_results=5), SEARCH_TIMEOUT, []
+        ))
 
     # Only fetch images when the query is likely about a person, place, animal,
     # object, or other visual topic — not for general/abstract questions
-    image_results = []
-    if should_fetch_images(user_input):
-        image_results = web_search_images(search_query, max_results=4)
+    image_task = None
+    if need.images:
+        image_task = asyncio.create_task(with_deadline(
+            asyncio.to_thread(web_search_images, search_query, max_results=4),
+            IMAGE_SEARCH_TIMEOUT, []
+        ))
+    video_task = start_video_lookup(user_input)
+    speculations = speculate_video(user_input)
+
+    # Only the text results gate the model; images and video follow later
+    search_results = []
+    if text_task:
+        started = time.monotonic()
+        search_results = await text_task
+        search_need.record_search(time.monotonic() - started)
 
     # Build source list for the frontend (verified real URLs)
     sources = []
@@ -268,59 +419,84 @@ def chat_search_stream():
         if url:
             sources.append({"number": i + 1, "title": title, "url": url, "body": body[:150]})
 
-    # Format search results as extra context for the AI
-    search_context = "## Web Search Results\n"
-    search_context += f"The user has enabled web search. Search query used: \"{search_query}\"\n"
-    search_context += "Here are the search results:\n\n"
-    for src in sources:
-        search_context += f"[{src['number']}] **{src['title']}**\n   {src['body']}\n\n"
-    if image_results:
-        search_context += "Relevant images have been found and are being displayed to the user above your response.\n"
-    search_context += (
-        "IMPORTANT: Synthesize these results into a helpful response. "
-        "When citing a source, use ONLY the bracket number format like [1], [2], etc. "
-        "Do NOT write out URLs or links — the UI will automatically convert [1], [2] etc. into clickable links. "
-        "Never invent or guess URLs. Use the conversation history to understand what the user is referring to."
-    )
+    # Optionally read the top result pages for passages that answer the question;
+    # they are ranked against the search query, which resolves follow-ups like "is he"
+    passages = []
+    if RETRIEVAL and sources:
+        passages = await retrieve(search_query, sources, model=model)
 
-    def generate():
-        try:
-            # Send image + source + video metadata as JSON prefix before the text stream
-            prefix_data = {"images": image_results, "sources": sources}
-            if video_data:
-                prefix_data["video"] = video_data
-            prefix = json.dumps(prefix_data)
-            yield prefix + "\n---STREAM---\n"
-
-            for chunk in process_query_stream(
-                user_input, model=model, history=clean_history,
-                extra_system=search_context
-            ):
-                yield chunk
-        except Exception as e:
-            yield f"Error: {str(e)}"
+    # Format search results as extra context for the AI
+    search_context = ""
+    if need.search:
+        search_context = "## Web Search Results\n"
+        search_context += f"The user has enabled web search. Search query used: \"{search_query}\"\n"
+        search_context += "Here are the search results:\n\n"
+        for src in sources:
+            search_context += f"[{src['number']}] **{src['title']}**\n   {src['body']}\n\n"
+        search_context += format_passages(passages)
+        if image_task:
+            search_context += "Related images may be displayed to the user above your response.\n"
+        search_context += (
+            "IMPORTANT: Synthesize these results into a helpful response. "
+            "When citing a source, use ONLY the bracket number format like [1], [2], etc. "
+            "Do NOT write out URLs or links — the UI will automatically convert [1], [2] etc. into clickable links. "
+            "Never invent or guess URLs. Use the conversation history to understand what the user is referring to."
+        )
+
+    metadata = {"sources": sources}
+    if not need.search:
+        metadata["search_skipped"] = need.reason
 
-    return Response(stream_with_context(generate()), mimetype='text/plain')
+    try:
+        ticket = scheduler.admit(model, PRIORITY_INTERACTIVE)
+    except QueueFullError as e:
+        for task in (image_task, video_task):
+            if task is not None:
+                task.cancel()
+        for speculation in speculations:
+            speculation.discard()
+        return queue_full_response(e)
+
+    return stream_response(event_stream(
+        process_query_stream(
+            user_input, model=model, history=clean_history,
+            extra_system=search_context, summary=summary, history_start=history_start
+        ),
+        lookups={"images": image_task, "video": video_task},
+        metadata=metadata,
+        ticket=ticket,
+        model=model,
+        handlers=task_handlers,
+        speculations=speculations
+    ))
+
+
+@app.route('/api/chat/cancel/<request_id>', methods=['POST'])
+async def cancel_chat(request_id):
+    """Stop a streaming response by the ``request_id`` from its first metadata event."""
+    if not generations.cancel(request_id):
+        return jsonify({"status": "error", "message": "No running response with that id"}), 404
+    return jsonify({"status": "success", "message": "Response cancelled"})
 
 
 @app.route('/api/search', methods=['POST'])
-def search():
+async def search():
     """Perform a web search and return results."""
-    data = request.get_json()
+    data = await request.get_json()
     query = data.get('query', '')
 
     if not query.strip():
         return jsonify({"status": "error", "message": "No query provided"}), 400
 
-    results = web_search(query, max_results=5)
+    results = await asyncio.to_thread(web_search, query, max_results=5)
     return jsonify({"status": "success", "results": results})
 
 
 @app.route('/api/execute-task', methods=['POST'])
-def execute_task():
+async def execute_task():
     """Execute a browser automation task."""
     try:
-        data = request.get_json()
+        data = await request.get_json()
 
         if not data:
             return jsonify({
@@ -345,7 +521,7 @@ def execute_task():
                 'message': f'Unknown task type: {task_type}'
             }), 400
 
-        result = handler.execute(params)
+        result = await handler.execute_async(params)
 
         return jsonify({
             'success': result.success,
@@ -361,49 +537,214 @@ def execute_task():
         }), 500
 
 
+@app.route('/api/execute-tasks', methods=['POST'])
+async def execute_task_batch():
+    """
+    Execute several tasks concurrently.
+
+    Expects ``{"tasks": [{"type", "params"}, ...]}``. Each task is limited
+    to TASK_TIMEOUT seconds, and a failed or timed out task does not affect
+    the others: ``results`` has one entry per task, in order, shaped like
+    the /api/execute-task response.
+    """
+    data = await request.get_json(silent=True) or {}
+    tasks = data.get('tasks')
+
+    if not isinstance(tasks, list) or not tasks:
+        return jsonify({'status': 'error', 'message': 'No tasks provided'}), 400
+    if len(tasks) > TASK_BATCH_MAX:
+        return jsonify({
+            'status': 'error',
+            'message': f'At most {TASK_BATCH_MAX} tasks per request'
+        }), 400
+    if not all(isinstance(task, dict) and task.get('type') and isinstance(task['type'], str)
+               for task in tasks):
+        return jsonify({'status': 'error', 'message': 'Every task needs a type'}), 400
+    if not all(isinstance(task.get('params', ''), str) for task in tasks):
+        return jsonify({'status': 'error', 'message': 'Task params must be a string'}), 400
+
+    batch = [(task['type'], task.get('params', '')) for task in tasks]
+    results = [
+        {
+            'success': result.success,
+            'message': result.message,
+            'url': result.url,
+            'task_type': result.task_type
+        }
+        for result in await execute_tasks(task_handlers, batch, TASK_TIMEOUT)
+    ]
+
+    return jsonify({
+        'status': 'success',
+        'succeeded': sum(result['success'] for result in results),
+        'results': results
+    })
+
+
 @app.route('/api/conversations', methods=['GET'])
-def get_conversations():
-    """Get all conversations."""
+async def get_conversations():
+    """
+    Get conversations.
+
+    With ``?view=summary`` returns a page of lightweight summaries
+    (``limit``, ``cursor``); otherwise returns every conversation in full.
+    """
+    if request.args.get('view') != 'summary':
+        return jsonify({
+            'status': 'success',
+            'conversations': await asyncio.to_thread(store.all)
+        })
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    try:
+        summaries, next_cursor = await asyncio.to_thread(
+            store.list_summaries, limit, request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify({
+        'status': 'success',
+        'conversations': summaries,
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/conversations/search', methods=['GET'])
+async def search_conversations():
+    """
+    Search the messages of stored conversations.
+
+    Takes ``q`` plus optional ``limit`` and ``offset``. Returns the matching
+    conversations, best match first, each with a snippet of its best
+    matching message in which matched words are wrapped in \\x02 and \\x03.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'status': 'error', 'message': 'No search query provided'}), 400
+
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    results, next_offset = await asyncio.to_thread(store.search, query, limit=limit, offset=offset)
     return jsonify({
         'status': 'success',
-        'conversations': conversations
+        'results': results,
+        'next_offset': next_offset
     })
 
 
 @app.route('/api/conversations', methods=['POST'])
-def save_conversations_endpoint():
-    """Save conversations."""
-    global conversations
+async def save_conversations_endpoint():
+    """Save a full conversations map (legacy bulk sync; only the changes are written)."""
     try:
-        data = request.get_json()
+        data = await request.get_json()
         if data:
-            conversations = data
-            save_conversations()
+            await asyncio.to_thread(store.sync, data)
+            history_cache.invalidate()
+            query_rewriter.forget()
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @app.route('/api/conversations/<conversation_id>', methods=['GET'])
-def get_conversation(conversation_id):
-    """Get a specific conversation."""
-    if conversation_id in conversations:
+async def get_conversation(conversation_id):
+    """Get a specific conversation, optionally a range of its messages (``offset``, ``limit``)."""
+    version = await asyncio.to_thread(store.get_version, conversation_id)
+    if version is None:
         return jsonify({
-            'status': 'success',
-            'conversation': conversations[conversation_id]
-        })
-    return jsonify({
-        'status': 'error',
-        'message': 'Conversation not found'
-    }), 404
+            'status': 'error',
+            'message': 'Conversation not found'
+        }), 404
+
+    etag = f'"{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    response = jsonify({
+        'status': 'success',
+        'conversation': await asyncio.to_thread(store.get, conversation_id, offset=offset, limit=limit)
+    })
+    response.headers['ETag'] = etag
+    return response
+
+
+@app.route('/api/conversations/<conversation_id>/messages', methods=['POST'])
+async def append_messages(conversation_id):
+    """Append messages to a conversation, creating it on first write."""
+    data = await request.get_json() or {}
+    messages = data.get('messages', [])
+    if not isinstance(messages, list):
+        return jsonify({'status': 'error', 'message': 'messages must be a list'}), 400
+    # Only chat turns are stored; anything else would be replayed to the model as history
+    for msg in messages:
+        if not (isinstance(msg, dict) and msg.get('role') in ('user', 'assistant')
+                and isinstance(msg.get('content'), str)):
+            return jsonify({
+                'status': 'error',
+                'message': "each message must have a role of 'user' or 'assistant' and string content"
+            }), 400
+
+    try:
+        version = await asyncio.to_thread(
+            store.append_messages, conversation_id, messages,
+            title=data.get('title'), created_at=data.get('created_at'),
+            expected_version=expected_version()
+        )
+    except ConflictError as e:
+        return conflict_response(e)
+    history_cache.appended(conversation_id, messages, version)
+
+    # Fold messages that slid out of the recent window into the summary
+    summarizer.schedule(conversation_id, data.get('model') or DEFAULT_MODEL)
+
+    response = jsonify({'status': 'success', 'version': version})
+    response.headers['ETag'] = f'"{version}"'
+    return response
+
+
+@app.route('/api/conversations/<conversation_id>', methods=['PATCH'])
+async def update_conversation(conversation_id):
+    """Update a conversation's title."""
+    data = await request.get_json() or {}
+    title = data.get('title')
+    if not isinstance(title, str):
+        return jsonify({'status': 'error', 'message': 'No title provided'}), 400
+
+    try:
+        version = await asyncio.to_thread(
+            store.set_title, conversation_id, title, expected_version=expected_version()
+        )
+    except ConflictError as e:
+        return conflict_response(e)
+    history_cache.appended(conversation_id, [], version)
+
+    if version is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Conversation not found'
+        }), 404
+
+    response = jsonify({'status': 'success', 'version': version})
+    response.headers['ETag'] = f'"{version}"'
+    return response
 
 
 @app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
-def delete_conversation(conversation_id):
+async def delete_conversation(conversation_id):
     """Delete a specific conversation."""
-    if conversation_id in conversations:
-        del conversations[conversation_id]
-        save_conversations()
+    try:
+        deleted = await asyncio.to_thread(
+            store.delete, conversation_id, expected_version=expected_version()
+        )
+    except ConflictError as e:
+        return conflict_response(e)
+    history_cache.invalidate(conversation_id)
+    query_rewriter.forget(conversation_id)
+
+    if deleted:
         return jsonify({'status': 'success'})
     return jsonify({
         'status': 'error',
@@ -412,34 +753,89 @@ def delete_conversation(conversation_id):
 
 
 @app.route('/api/clear', methods=['POST'])
-def clear():
+async def clear():
     """Clear current conversation history."""
     result = clear_conversation()
     return jsonify({"status": "success", "message": result})
 
 
 @app.route('/api/models', methods=['GET'])
-def models():
-    """List available Ollama models."""
-    available_models = list_models()
+async def models():
+    """List available Ollama models with whether each is loaded."""
+    available_models, _ = await asyncio.gather(
+        asyncio.to_thread(list_models), model_manager.refresh()
+    )
     if isinstance(available_models, str):
         return jsonify({"status": "error", "message": available_models})
-    return jsonify({"status": "success", "models": available_models})
+    return jsonify({
+        "status": "success",
+        "models": available_models,
+        "residency": {name: model_manager.status(name) for name in available_models},
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    """Report cache counters for monitoring."""
+    return jsonify({
+        "status": "success",
+        "search_cache": search_cache.stats(),
+        "video_cache": video_cache.stats(),
+        "page_cache": page_cache.stats(),
+        "summarizer": summarizer.stats(),
+        "history_cache": history_cache.stats(),
+        "ollama": pool.stats(),
+        "scheduler": scheduler.stats(),
+        "generations": generations.stats(),
+        "response_cache": response_cache.stats(),
+        "video_speculation": speculation_stats(),
+        "search_need": search_need.stats(),
+        "query_rewriter": query_rewriter.stats(),
+    })
+
+
+@app.before_serving
+async def start_model_manager():
+    """Start loading and keeping warm models in the background."""
+    model_manager.start()
+
+
+@app.after_serving
+async def save_caches():
+    """Persist caches that have a file configured."""
+    search_cache.save()
+    response_cache.save()
+
+
+@app.after_serving
+async def stop_model_manager():
+    """Stop the keep-alive pings."""
+    await model_manager.stop()
 
 
 @app.route('/api/health', methods=['GET'])
-def health():
-    """Check if Ollama is running."""
-    try:
-        ollama.list()
-        return jsonify({"status": "healthy", "message": "Ollama is running"})
-    except Exception as e:
-        return jsonify({"status": "unhealthy", "message": str(e)}), 503
+async def health():
+    """Check which Ollama servers are running and which models are loaded."""
+    if not await pool.check():
+        return jsonify({
+            "status": "unhealthy",
+            "message": "No Ollama server is reachable",
+            "servers": pool.stats(),
+        }), 503
+    return jsonify({
+        "status": "healthy",
+        "message": "Ollama is running",
+        "servers": pool.stats(),
+        "models": model_manager.stats(),
+    })
 
 
 if __name__ == '__main__':
+    import uvicorn
+
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("DEBUG", "true").lower() == "true"
+    workers = int(os.getenv("WORKERS", 1))
 
     print("\n" + "=" * 50)
     print("ChatFreeGPT API Server")
@@ -453,4 +849,9 @@ if __name__ == '__main__':
     print(f"  3. Pull a model: ollama pull {DEFAULT_MODEL}")
     print("=" * 50 + "\n")
 
-    app.run(host='0.0.0.0', port=port, debug=debug)
+    # One event loop per worker serves every concurrent stream; reload only in debug
+    uvicorn.run(
+        "app:app", host='0.0.0.0', port=port,
+        reload=debug, workers=1 if debug else workers,
+        timeout_graceful_shutdown=10,
+    )
@@ -0,0 +1,150 @@
+"""Minimal fake Ollama server for load tests and local development.
+
+Speaks just enough of the Ollama HTTP API (/api/chat, /api/generate,
+/api/embed, /api/tags, /api/ps) for the ``ollama`` client, streaming a fixed number of
+tokens with a configurable delay so generation time is predictable. The
+first request for a model waits ``--load-delay`` seconds, like a model load.
+
+    python benchmarks/fake_ollama.py --port 11500 --tokens 50 --token-delay 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from quart import Quart, request, Response, jsonify
+
+app = Quart(__name__)
+app.config.update(TOKENS=50, TOKEN_DELAY=0.02, MODELS=["llama3.2"], LOAD_DELAY=0.0)
+
+# Loaded model name -> expiry time
+loaded = {}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _full_name(model):
+    return model if ':' in model else f"{model}:latest"
+
+
+async def _load(model, keep_alive):
+    """Simulate loading a model; return the load duration in nanoseconds."""
+    name = _full_name(model)
+    started = time.perf_counter_ns()
+    if loaded.get(name, datetime.min.replace(tzinfo=timezone.utc)) < datetime.now(timezone.utc):
+        await asyncio.sleep(app.config['LOAD_DELAY'])
+    seconds = 300 if keep_alive in (None, "") else keep_alive
+    if isinstance(seconds, str):
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        seconds = float(seconds[:-1]) * units[seconds[-1]] if seconds[-1] in units else float(seconds)
+    loaded[name] = datetime.now(timezone.utc) + timedelta(seconds=seconds if seconds >= 0 else 10 ** 9)
+    return time.perf_counter_ns() - started
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    data = await request.get_json()
+    model = data.get('model', 'llama3.2')
+    tokens = app.config['TOKENS']
+    delay = app.config['TOKEN_DELAY']
+    started = time.perf_counter_ns()
+    await _load(model, data.get('keep_alive'))
+
+    def final(content=""):
+        return {
+            "model": model, "created_at": _now(),
+            "message": {"role": "assistant", "content": content},
+            "done": True, "done_reason": "stop",
+            "total_duration": time.perf_counter_ns() - started,
+            "prompt_eval_count": sum(len(m.get('content', '')) // 4 for m in data.get('messages', [])),
+            "eval_count": tokens,
+        }
+
+    if not data.get('stream', True):
+        await asyncio.sleep(tokens * delay)
+        return jsonify(final("token " * tokens))
+
+    async def generate():
+        for _ in range(tokens):
+            await asyncio.sleep(delay)
+            yield json.dumps({
+                "model": model, "created_at": _now(),
+                "message": {"role": "assistant", "content": "token "},
+                "done": False,
+            }) + "\n"
+        yield json.dumps(final()) + "\n"
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.timeout = None
+    return response
+
+
+@app.route('/api/generate', methods=['POST'])
+async def generate():
+    # Only the empty-prompt form the app uses to load models
+    data = await request.get_json()
+    model = data.get('model', 'llama3.2')
+    load_duration = await _load(model, data.get('keep_alive'))
+    return jsonify({
+        "model": model, "created_at": _now(), "response": "",
+        "done": True, "done_reason": "load", "load_duration": load_duration,
+    })
+
+
+@app.route('/api/embed', methods=['POST'])
+async def embed():
+    # Hashed bag of words: texts sharing most words get similar vectors
+    data = await request.get_json()
+    inputs = data.get('input', '')
+    embeddings = []
+    for text in [inputs] if isinstance(inputs, str) else inputs:
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        embeddings.append(vector)
+    return jsonify({"model": data.get('model', ''), "embeddings": embeddings})
+
+
+@app.route('/api/ps', methods=['GET'])
+async def ps():
+    now = datetime.now(timezone.utc)
+    return jsonify({"models": [
+        {"name": name, "model": name, "size": 0, "size_vram": 0, "digest": "0" * 64,
+         "expires_at": expires_at.isoformat()}
+        for name, expires_at in loaded.items() if expires_at > now
+    ]})
+
+
+@app.route('/api/tags', methods=['GET'])
+async def tags():
+    return jsonify({"models": [
+        {"name": name, "model": name, "modified_at": _now(), "size": 0, "digest": "0" * 64}
+        for name in app.config['MODELS']
+    ]})
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--models', default="llama3.2", help="Comma-separated model names")
+    parser.add_argument('--load-delay', type=float, default=0.0, help="Seconds to load a model")
+    args = parser.parse_args()
+
+    app.config.update(
+        TOKENS=args.tokens, TOKEN_DELAY=args.token_delay, LOAD_DELAY=args.load_delay,
+        MODELS=[m.strip() for m in args.models.split(',') if m.strip()],
+    )
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Microbenchmark: single-pass intent classification vs the per-function scans.
+
+The ``legacy_*`` functions are the keyword checks as they were before
+``intent.classify`` replaced them. The benchmark first checks that both
+give the same answers on a corpus of messages, then times classifying
+each message for every intent (task hints, time words, images, YouTube).
+
+    python benchmarks/intent_bench.py --repeat 2000
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent import classify  # noqa: E402
+
+MESSAGES = [
+    "Play Shape of You on YouTube",
+    "play despacito",
+    "watch the latest SpaceX launch on youtube",
+    "listen to lofi beats",
+    "Send an email to john@example.com about the meeting tomorrow",
+    "Search for best Python tutorials",
+    "look up the weather in Paris",
+    "Open github.com",
+    "go to wikipedia.org and find the page on black holes",
+    "What time is it now?",
+    "what's today's date",
+    "Who is Taylor Swift?",
+    "show me a picture of the eiffel tower",
+    "what is a monad",
+    "how to fix a segmentation fault in C",
+    "Explain the difference between TCP and UDP",
+    "who made you",
+    "where is mount everest",
+    "Can you write a poem about the ocean?",
+    "tell me a joke",
+    "I know you can help me translate this sentence into French",
+    "what does the flag of japan look like",
+    "is he a good singer",
+    "youtube cat videos",
+    "cat videos on youtube",
+    "play",
+    "play   ",
+    "",
+    "Compose a message to my team about the release of version 2.0 of our product",
+    "The quick brown fox jumps over the lazy dog " * 8,
+]
+
+TIME_WORDS = ['time', 'date', 'today', 'now', 'current']
+
+
+def legacy_detect_task_intent(query):
+    """
+    Detect if the query contains task-related intent.
+    Returns hints to help the AI understand the context.
+    """
+    query_lower = query.lower()
+
+    hints = []
+
+    # YouTube detection
+    youtube_patterns = ['play', 'youtube', 'music', 'song', 'video', 'watch', 'listen']
+    if any(pattern in query_lower for pattern in youtube_patterns):
+        hints.append("User might want to play something on YouTube")
+
+    # Email detection
+    email_patterns = ['email', 'mail', 'send', 'compose', 'write to', 'message to']
+    if any(pattern in query_lower for pattern in email_patterns):
+        hints.append("User might want to compose an email")
+
+    # Search detection
+    search_patterns = ['search', 'look up', 'find', 'google', 'search for']
+    if any(pattern in query_lower for pattern in search_patterns):
+        hints.append("User might want to search the web")
+
+    # URL detection
+    url_patterns = ['open', 'go to', 'visit', 'navigate to', '.com', '.org', '.net', 'website']
+    if any(pattern in query_lower for pattern in url_patterns):
+        hints.append("User might want to open a website")
+
+    return hints
+
+
+def legacy_should_fetch_images(query):
+    """Determine if a query would benefit from image results.
+
+    Returns True for queries about people, places, animals, products,
+    landmarks, etc. Returns False for abstract/conceptual questions.
+    """
+    q = query.lower().strip()
+
+    # Keywords that suggest visual content is useful
+    visual_keywords = [
+        'who is', 'who was', 'who were',
+        'show me', 'picture of', 'photo of', 'images of', 'look like', 'looks like',
+        'where is', 'where are',
+        'celebrity', 'actor', 'actress', 'singer', 'player', 'athlete',
+        'flag of', 'logo of', 'brand',
+        'mountain', 'beach', 'island',
+        'painting', 'artwork',
+    ]
+
+    # Keywords that suggest NO images needed (abstract/conceptual)
+    no_image_keywords = [
+        'what is', 'what are', 'how to', 'why', 'explain', 'define',
+        'difference between', 'meaning of', 'tutorial', 'guide',
+        'code', 'programming', 'error', 'bug', 'fix',
+        'best way', 'how can i', 'should i', 'help me',
+        'calculate', 'convert', 'translate',
+        'who are you', 'your name', 'your creator', 'who made you', 'who built you',
+        'create', 'generate', 'make me', 'draw', 'write',
+        'can you', 'do you', 'are you', 'tell me',
+    ]
+
+    # Check no-image keywords first (higher priority)
+    for keyword in no_image_keywords:
+        if keyword in q:
+            return False
+
+    # Check visual keywords
+    for keyword in visual_keywords:
+        if keyword in q:
+            return True
+
+    # Default: no images for generic queries
+    return False
+
+
+def legacy_detect_youtube_request(query):
+    """Check if user wants to play a YouTube video and extract the search term."""
+    q = query.lower().strip()
+    youtube_patterns = [
+        r'play\s+(.+?)(?:\s+on\s+youtube)?$',
+        r'play\s+(.+?)(?:\s+on\s+yt)?$',
+        r'(?:open|watch|listen\s+to)\s+(.+?)(?:\s+on\s+youtube)?$',
+        r'youtube\s+(.+)',
+        r'(.+?)\s+on\s+youtube',
+    ]
+    for pattern in youtube_patterns:
+        match = re.search(pattern, q)
+        if match:
+            search_term = match.group(1).strip()
+            # Remove trailing "on youtube" / "on yt" if still present
+            search_term = re.sub(r'\s+on\s+(youtube|yt)$', '', search_term).strip()
+            if search_term:
+                return search_term
+    return None
+
+
+def legacy_all(query):
+    """Everything the old code computed for one message."""
+    return (
+        legacy_detect_task_intent(query),
+        any(word in query.lower() for word in TIME_WORDS),
+        legacy_should_fetch_images(query),
+        legacy_detect_youtube_request(query),
+    )
+
+
+def classify_all(query, cached=True):
+    intent = classify(query) if cached else classify.__wrapped__(query)
+    return intent.hints, intent.mentions_time, intent.wants_images, intent.youtube_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    mismatches = [m for m in MESSAGES if legacy_all(m) != classify_all(m, cached=False)]
+    for message in mismatches:
+        print(f"MISMATCH {message!r}: {legacy_all(message)} != {classify_all(message, cached=False)}")
+    print(f"{len(MESSAGES) - len(mismatches)}/{len(MESSAGES)} messages classified identically")
+
+    runs = {
+        'legacy functions': lambda: [legacy_all(m) for m in MESSAGES],
+        'single pass': lambda: [classify_all(m, cached=False) for m in MESSAGES],
+        'single pass (cached)': lambda: [classify_all(m) for m in MESSAGES],
+    }
+    per_message = {}
+    for name, run in runs.items():
+        seconds = min(timeit.repeat(run, number=args.repeat, repeat=3))
+        per_message[name] = seconds / (args.repeat * len(MESSAGES)) * 1e6
+        print(f"{name:>22}: {per_message[name]:7.2f} us/message")
+    print(f"speedup (uncached): {per_message['legacy functions'] / per_message['single pass']:.1f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Concurrency load test for the streaming chat endpoint.
+
+Starts the fake Ollama server and the API (under uvicorn), then fires
+batches of concurrent /api/chat/stream requests. With the async server a
+batch of N streams should take about as long as a single stream, since
+every stream shares one event loop instead of holding a thread.
+
+    python benchmarks/loadtest.py --concurrency 1,10,50,100,200
+
+With ``--backends N`` it starts N fake Ollama servers and spreads the
+streams over them through OLLAMA_HOSTS.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_for(url, timeout=20.0):
+    """Poll a URL until it answers."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def one_stream(client, url):
+    """Run one streaming request; return (time to first byte, total time), or None on failure."""
+    started = time.perf_counter()
+    first = None
+    try:
+        async with client.stream('POST', url, json={"message": "hello", "model": "llama3.2"}) as resp:
+            async for _ in resp.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter() - started
+    except httpx.TransportError:
+        return None
+    return first or 0.0, time.perf_counter() - started
+
+
+async def run(api, levels):
+    url = f"{api}/api/chat/stream"
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        await one_stream(client, url)  # warm-up
+        print(f"{'streams':>8} {'errors':>7} {'wall s':>8} {'p50 ttfb':>9} {'p95 ttfb':>9} {'p95 total':>10}")
+        for n in levels:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(one_stream(client, url) for _ in range(n)))
+            wall = time.perf_counter() - started
+            ok = [r for r in results if r is not None]
+            if not ok:
+                print(f"{n:>8} {n:>7} {wall:>8.2f}")
+                continue
+            ttfb = sorted(r[0] for r in ok)
+            total = sorted(r[1] for r in ok)
+            p = lambda xs, q: xs[min(int(len(xs) * q), len(xs) - 1)]
+            print(f"{n:>8} {n - len(ok):>7} {wall:>8.2f} {p(ttfb, .5):>9.3f} "
+                  f"{p(ttfb, .95):>9.3f} {p(total, .95):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default="1,10,50,100,200")
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--api-port', type=int, default=5055)
+    parser.add_argument('--ollama-port', type=int, default=11500)
+    parser.add_argument('--backends', type=int, default=1)
+    parser.add_argument('--model-concurrency', type=int, default=1000,
+                        help="Scheduler limit per model and server (default: effectively none)")
+    args = parser.parse_args()
+
+    ports = [args.ollama_port + i for i in range(args.backends)]
+    env = dict(
+        os.environ,
+        OLLAMA_HOSTS=",".join(f"http://127.0.0.1:{port}" for port in ports),
+        CONVERSATIONS_DB=os.path.join(tempfile.mkdtemp(), 'loadtest.db'),
+        MODEL_CONCURRENCY=str(args.model_concurrency),
+    )
+    procs = [
+        subprocess.Popen([
+            sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_ollama.py'),
+            '--port', str(port), '--tokens', str(args.tokens),
+            '--token-delay', str(args.token_delay),
+        ], env=env)
+        for port in ports
+    ]
+    procs.append(
+        subprocess.Popen([
+            sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(args.api_port),
+            '--log-level', 'warning',
+        ], env=env, cwd=ROOT)
+    )
+    api = f"http://127.0.0.1:{args.api_port}"
+    try:
+        for port in ports:
+            asyncio.run(wait_for(f"http://127.0.0.1:{port}/api/tags"))
+        asyncio.run(wait_for(f"{api}/api/health"))
+        asyncio.run(run(api, [int(n) for n in args.concurrency.split(',')]))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Train and evaluate the search-need classifier on the labelled message set.
+
+benchmarks/data/search_need.jsonl holds messages labelled with whether a
+web search is needed (``search``) and whether images would help
+(``images``); ``history`` marks follow-ups in an ongoing conversation.
+About a quarter of the messages, picked by a hash of their text, are a
+validation split: never trained on, but looked at when tuning the rules
+and threshold. benchmarks/data/search_need_test.jsonl is a separate test
+set that is only ever reported, never tuned against.
+
+    python benchmarks/search_need_eval.py --train   # fit and write search_need_model.json
+    python benchmarks/search_need_eval.py           # evaluate the current model
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent import classify  # noqa: E402
+from search_need import SEARCH_MODEL_FILE, SearchNeed, SearchNeedClassifier, features  # noqa: E402
+
+DATA_FILE = os.path.join(ROOT, 'benchmarks', 'data', 'search_need.jsonl')
+TEST_FILE = os.path.join(ROOT, 'benchmarks', 'data', 'search_need_test.jsonl')
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load(path=DATA_FILE):
+    rows = read(path)
+    train = [r for r in rows if zlib.crc32(r['text'].encode()) % 4]
+    validation = [r for r in rows if not zlib.crc32(r['text'].encode()) % 4]
+    return train, validation
+
+
+def train(rows, epochs=300, rate=0.1, l2=0.001, seed=0):
+    """Logistic regression by stochastic gradient descent."""
+    examples = [(features(r['text'], r['history']), 1.0 if r['search'] else 0.0) for r in rows]
+    weights = {}
+    rng = random.Random(seed)
+    for _ in range(epochs):
+        rng.shuffle(examples)
+        for feats, label in examples:
+            score = sum(weights.get(f, 0.0) for f in feats)
+            error = 1 / (1 + math.exp(-max(min(score, 30), -30))) - label
+            for f in feats:
+                w = weights.get(f, 0.0)
+                weights[f] = w - rate * (error + l2 * w)
+    return {f: round(w, 4) for f, w in sorted(weights.items()) if abs(w) >= 0.001}
+
+
+def evaluate(name, decide, rows):
+    """Print how ``decide(text, history) -> SearchNeed`` does against the labels."""
+    tp = fp = fn = tn = image_hits = 0
+    started = time.perf_counter()
+    for r in rows:
+        need = decide(r['text'], [{}] if r['history'] else [])
+        tp += need.search and r['search']
+        fp += need.search and not r['search']
+        fn += not need.search and r['search']
+        tn += not need.search and not r['search']
+        image_hits += need.images == r['images']
+    elapsed = (time.perf_counter() - started) / len(rows) * 1e6
+    print(f"{name:>16}: accuracy {(tp + tn) / len(rows):.3f}  "
+          f"searches kept {tp / max(tp + fn, 1):.3f}  "
+          f"unneeded searches skipped {tn / max(tn + fp, 1):.3f}  "
+          f"images {image_hits / len(rows):.3f}  "
+          f"{elapsed:.0f} us/message")
+    return fn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--train', action='store_true', help="Fit the model and write it first")
+    parser.add_argument('--model', default=SEARCH_MODEL_FILE)
+    args = parser.parse_args()
+
+    train_rows, validation = load()
+    test = read(TEST_FILE)
+    print(f"{len(train_rows)} training messages, {len(validation)} validation, {len(test)} test")
+
+    if args.train:
+        weights = train(train_rows)
+        with open(args.model, 'w') as f:
+            json.dump({'weights': weights}, f, indent=0, sort_keys=True)
+        print(f"Wrote {len(weights)} weights to {args.model}")
+
+    with open(args.model) as f:
+        weights = json.load(f)['weights']
+    classifier = SearchNeedClassifier(weights=weights)
+
+    def model_only(text, history):
+        search = classifier.probability(text, bool(history)) >= classifier.threshold
+        return SearchNeed(search=search, images=search and classify(text).wants_images, reason="model")
+
+    for name, rows in (('validation', validation), ('test', test)):
+        print(f"{name} set:")
+        evaluate('always search', SearchNeedClassifier(enabled=False).decide, rows)
+        evaluate('rules only', SearchNeedClassifier(weights={}).decide, rows)
+        evaluate('model only', model_only, rows)
+        missed = evaluate('rules + model', classifier.decide, rows)
+        print(f"missed searches on {name} set: {missed}")
+
+
+if __name__ == '__main__':
+    main()
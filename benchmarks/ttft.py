@@ -0,0 +1,116 @@
+"""Time-to-first-token benchmark for the prompt layouts.
+
+Replays the same multi-turn web-search conversation with the ``legacy``
+and ``stable`` prompt layouts against a real Ollama server (the fake one
+has no prompt cache), and reports per-turn time to first token and how
+many prompt tokens Ollama had to evaluate. In the stable layout the system
+prompt and history are a byte-identical prefix of the previous turn's
+prompt, so later turns only evaluate the new tail.
+
+    OLLAMA_KEEP_ALIVE=30m python benchmarks/ttft.py --model llama3.2 --turns 8
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import ollama
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import OLLAMA_KEEP_ALIVE, _build_messages, chat_kwargs  # noqa: E402
+
+QUESTIONS = [
+    "What is the tallest mountain in the world?",
+    "How long does it take to climb it?",
+    "What equipment do climbers need?",
+    "Who was the first person to reach the top?",
+    "What are the biggest dangers on the way up?",
+    "How much does an expedition cost?",
+    "Which season is best for climbing?",
+    "What other mountains are popular with climbers?",
+]
+
+
+def search_context(turn, question):
+    """Per-turn search results, standing in for the real DuckDuckGo context."""
+    lines = ["## Web Search Results", f"Search query used: \"{question}\"", ""]
+    for i in range(1, 6):
+        lines.append(f"[{i}] **Result {i} for turn {turn}**\n   "
+                     f"Snippet {i} about {question.lower()} with a few details.")
+    return "\n".join(lines)
+
+
+async def one_turn(client, model, messages, max_tokens):
+    """Stream one reply; return (time to first token, prompt tokens evaluated, reply)."""
+    kwargs = chat_kwargs(model)
+    kwargs['options'] = {**kwargs['options'], 'num_predict': max_tokens, 'temperature': 0}
+    started = time.perf_counter()
+    first = None
+    parts = []
+    evaluated = 0
+    async for chunk in await client.chat(model=model, messages=messages, stream=True, **kwargs):
+        if first is None and chunk['message']['content']:
+            first = time.perf_counter() - started
+        parts.append(chunk['message']['content'])
+        if chunk.get('done'):
+            evaluated = chunk.get('prompt_eval_count') or 0
+    return first or time.perf_counter() - started, evaluated, "".join(parts)
+
+
+async def run_layout(client, model, layout, turns, max_tokens):
+    """Play the conversation in one layout; return per-turn (ttft, evaluated) pairs."""
+    history = []
+    results = []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        messages = _build_messages(
+            question, history, extra_system=search_context(turn, question),
+            model=model, layout=layout
+        )
+        ttft, evaluated, reply = await one_turn(client, model, messages, max_tokens)
+        results.append((ttft, evaluated))
+        history += [{"role": "user", "content": question}, {"role": "assistant", "content": reply}]
+    return results
+
+
+async def run(args):
+    client = ollama.AsyncClient()
+    # Load the model first so the first layout does not pay for it
+    await client.chat(model=args.model, messages=[{"role": "user", "content": "hi"}],
+                      options={'num_predict': 1}, keep_alive=OLLAMA_KEEP_ALIVE)
+
+    print(f"{'layout':>7} {'turn':>5} {'ttft ms':>9} {'prompt eval':>12}")
+    summary = {}
+    for layout in ("legacy", "stable"):
+        runs = [await run_layout(client, args.model, layout, args.turns, args.max_tokens)
+                for _ in range(args.runs)]
+        for turn in range(args.turns):
+            ttft = statistics.median(r[turn][0] for r in runs)
+            evaluated = statistics.median(r[turn][1] for r in runs)
+            print(f"{layout:>7} {turn + 1:>5} {ttft * 1000:>9.0f} {evaluated:>12.0f}")
+        # Turn 1 has nothing to reuse in either layout
+        summary[layout] = statistics.median(r[turn][0] for r in runs for turn in range(1, args.turns))
+
+    print()
+    for layout, ttft in summary.items():
+        print(f"{layout:>7} median ttft after turn 1: {ttft * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=os.getenv("DEFAULT_MODEL", "llama3.2"))
+    parser.add_argument('--turns', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-tokens', type=int, default=64)
+    args = parser.parse_args()
+    if args.turns < 2:
+        parser.error("--turns must be at least 2")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
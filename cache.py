@@ -0,0 +1,133 @@
+"""In-memory TTL + LRU cache shared by ChatFreeGPT's lookup helpers."""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe cache whose entries expire after a time-to-live.
+
+    When full, the least recently used entry is evicted. Hit, miss,
+    eviction and expiry counters are kept for monitoring. If ``path`` is
+    given, entries can be saved to and reloaded from a JSON file, so keys
+    must be strings and values JSON-serializable in that case.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300, path: str | None = None):
+        """
+        Create a cache.
+
+        Args:
+            maxsize: Maximum number of entries kept
+            ttl: Default time-to-live in seconds
+            path: Optional JSON file for persistence across restarts
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if path:
+            self.load()
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, or ``default`` if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        """Remove a key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self) -> list:
+        """Snapshot of unexpired (key, value) pairs; doesn't count as lookups."""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def save(self) -> None:
+        """Write unexpired entries to ``path`` (no-op without a path)."""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [
+                [key, expires_at, value]
+                for key, (expires_at, value) in self._data.items()
+                if expires_at > now
+            ]
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving cache {self.path}: {e}")
+
+    def load(self) -> None:
+        """Load unexpired entries from ``path`` if the file exists."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading cache {self.path}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires_at, value in entries[-self.maxsize:]:
+                if expires_at > now:
+                    self._data[key] = (expires_at, value)
@@ -0,0 +1,134 @@
+"""Token budgeting for the conversation history sent to the model."""
+
+import math
+import os
+import re
+from functools import lru_cache
+
+# Context window assumed for every model unless overridden per model, and the
+# share of it kept free for the response
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", 4096))
+RESPONSE_TOKEN_RESERVE = int(os.getenv("RESPONSE_TOKEN_RESERVE", 1024))
+
+# Per-model context windows, e.g. "llama3.2=8192,mistral=32768"
+MODEL_CONTEXT_WINDOWS = {
+    name.strip(): int(size)
+    for name, _, size in (
+        item.partition('=') for item in os.getenv("MODEL_CONTEXT_WINDOWS", "").split(',')
+    )
+    if name.strip() and size.strip().isdigit()
+}
+
+# Average characters per token for common model families' tokenizers
+CHARS_PER_TOKEN = {
+    'llama': 3.8,
+    'mistral': 3.6,
+    'mixtral': 3.6,
+    'gemma': 4.0,
+    'qwen': 3.7,
+    'phi': 3.8,
+    'deepseek': 3.7,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+# Chat templates add a few tokens of role markup around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def model_family(model: str) -> str:
+    """Map a model name like ``llama3.2:3b`` to its tokenizer family."""
+    name = model.lower().split('/')[-1]
+    for family in CHARS_PER_TOKEN:
+        if name.startswith(family):
+            return family
+    return ''
+
+
+def context_window(model: str) -> int:
+    """Context window size in tokens for a model."""
+    base = model.split(':')[0]
+    return MODEL_CONTEXT_WINDOWS.get(model, MODEL_CONTEXT_WINDOWS.get(base, CONTEXT_WINDOW))
+
+
+@lru_cache(maxsize=8192)
+def _estimate(family: str, text: str) -> int:
+    # Character ratio for prose; word/punctuation count catches code and
+    # symbol-heavy text where the ratio underestimates
+    by_chars = math.ceil(len(text) / CHARS_PER_TOKEN.get(family, DEFAULT_CHARS_PER_TOKEN))
+    if len(text) > 20000:
+        return by_chars
+    return max(by_chars, len(_PIECE_PATTERN.findall(text)))
+
+
+def estimate_tokens(text: str, model: str = "") -> int:
+    """
+    Estimate how many tokens ``text`` takes for ``model``.
+
+    Estimates are cached per (tokenizer family, text), so re-counting the
+    same history every turn is a dictionary lookup.
+    """
+    if not text:
+        return 0
+    return _estimate(model_family(model), text)
+
+
+def message_tokens(message: dict, model: str = "") -> int:
+    """Estimated tokens for one chat message, including role markup."""
+    return estimate_tokens(message.get('content', ''), model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_budget(model: str, *prompt_parts: str, window: int | None = None) -> int:
+    """
+    Tokens left for history once the fixed prompt parts and response reserve are counted.
+
+    ``window`` is the context size the request is sent with; it defaults
+    to ``context_window(model)``.
+    """
+    used = sum(estimate_tokens(part, model) + MESSAGE_OVERHEAD_TOKENS for part in prompt_parts if part)
+    return max((window or context_window(model)) - RESPONSE_TOKEN_RESERVE - used, 0)
+
+
+def fit_history(history: list[dict], budget: int, model: str = "", align: int = 1,
+                first: int = 0) -> list[dict]:
+    """
+    Keep the most recent messages that fit in ``budget`` tokens.
+
+    If even the newest message is too large on its own, its beginning is
+    kept, truncated to the budget.
+
+    Args:
+        history: Messages oldest first
+        budget: Token budget for the history
+        model: Model name, for the tokenizer estimate
+        align: Drop old messages in steps of this many, so the retained
+            history starts at the same message for several turns in a row
+        first: Position of ``history[0]`` in the whole conversation; steps
+            are counted from the conversation's first message, so they stay
+            put when ``history`` is a sliding window of recent messages
+
+    Returns:
+        The retained suffix of ``history``
+    """
+    total = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        tokens = message_tokens(history[i], model)
+        if total + tokens > budget:
+            break
+        total += tokens
+        start = i
+
+    if start == len(history) and history and budget > MESSAGE_OVERHEAD_TOKENS:
+        newest = history[-1]
+        ratio = CHARS_PER_TOKEN.get(model_family(model), DEFAULT_CHARS_PER_TOKEN)
+        keep = int((budget - MESSAGE_OVERHEAD_TOKENS) * ratio * 0.9)
+        return [{**newest, 'content': newest.get('content', '')[:keep] + " …[truncated]"}]
+
+    if 0 < start < len(history) and align > 1:
+        aligned = -(-(first + start) // align) * align - first
+        if aligned < len(history):
+            start = aligned
+
+    return history[start:]
@@ -0,0 +1,206 @@
+"""Server-sent event (SSE) framing for the streaming chat endpoints.
+
+A chat stream is a sequence of typed events:
+
+- ``metadata``: ``{"sources": [...]}``, ``{"images": [...]}`` or ``{"video": {...}}``,
+  sent whenever the data becomes available (before, during or after the text)
+- ``queue``: ``{"position": n}``, the request is waiting for a generation
+  slot; sent again whenever the position changes
+- ``token``: ``{"text": "..."}``, a piece of the response text, with task
+  markers removed
+- ``task``: a task marker closed in the response: ``{"type", "params",
+  "marker", "position", "index", "result"}``. ``marker`` is the raw marker
+  text, ``position`` where it sat in the displayed text and ``index`` its
+  order among the markers, so clients can rebuild the full response;
+  ``result`` is the handler's TaskResult as a dict (None if there is no
+  handler or it did not finish in time)
+- ``error``: ``{"message": "..."}``, generation failed
+- ``done``: ``{}``, the stream is complete, or ``{"cancelled": true}`` if
+  it was cancelled through ``/api/chat/cancel/<request_id>``
+
+The first ``metadata`` event carries the stream's ``request_id``.
+"""
+
+import asyncio
+import dataclasses
+import json
+import os
+import time
+
+from generations import generations, COMPLETED, CANCELLED, DISCONNECTED, FAILED
+from tasks import TaskMarkerParser
+
+# Tokens are coalesced into one event until this many seconds have passed
+# since the last flush or this many characters are buffered
+FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", 0.05))
+FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", 256))
+
+# Longest wait for a task handler before its task event is sent without a result
+TASK_RESOLVE_TIMEOUT = float(os.getenv("TASK_RESOLVE_TIMEOUT", 8))
+
+
+def sse(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def resolve_task(handler, params):
+    """Run a task handler; None if it fails or takes too long."""
+    try:
+        result = await asyncio.wait_for(handler.execute_async(params), TASK_RESOLVE_TIMEOUT)
+        return dataclasses.asdict(result)
+    except Exception as e:
+        print(f"Error resolving task {handler.task_type}: {e}")
+        return None
+
+
+async def event_stream(chunks, lookups=None, metadata=None, ticket=None, model=None, handlers=None,
+                       speculations=None):
+    """
+    Turn a response text stream into SSE frames.
+
+    Args:
+        chunks: Async iterator of response text
+        lookups: Dict of metadata key -> task; each result is sent as a
+            ``metadata`` event as soon as it resolves (None entries are skipped)
+        metadata: Metadata dict sent before any text
+        ticket: Scheduler ticket; ``chunks`` is only started once its slot
+            is granted, and the ticket is released when the stream ends
+        model: If given, the stream is registered as a cancellable generation
+            of this model; its ``request_id`` is sent in the first
+            ``metadata`` event
+        handlers: Dict of task type -> TaskHandler used to resolve task
+            markers as soon as they close
+        speculations: List of Speculation; each result is sent as a
+            ``metadata`` event only if a marker of its task type appears,
+            and the lookup is cancelled if the response ends without one
+
+    Yields:
+        SSE frames
+    """
+    # Background work whose result becomes an event: task -> (event, key or payload)
+    pending = {task: ("metadata", key) for key, task in (lookups or {}).items() if task is not None}
+    speculations = speculations or []
+    parser = TaskMarkerParser()
+    displayed = 0
+    marker_count = 0
+    next_chunk = None
+    cancel_wait = None
+    generation = generations.start(model) if model else None
+    outcome = DISCONNECTED
+    buffer = []
+    buffered = 0
+    last_flush = 0.0
+
+    try:
+        if generation is not None:
+            metadata = {"request_id": generation.request_id, **(metadata or {})}
+        if metadata:
+            yield sse("metadata", metadata)
+
+        if ticket is not None:
+            async for position in ticket.positions():
+                yield sse("queue", {"position": position})
+
+        if generation is not None:
+            if generation.cancelled.is_set():
+                outcome = CANCELLED
+                yield sse("done", {"cancelled": True})
+                return
+            cancel_wait = asyncio.ensure_future(generation.cancelled.wait())
+
+        iterator = chunks.__aiter__()
+        next_chunk = asyncio.ensure_future(iterator.__anext__())
+
+        while next_chunk is not None or pending:
+            waiting = set(pending) | ({next_chunk} if next_chunk is not None else set())
+            if cancel_wait is not None and next_chunk is not None:
+                waiting.add(cancel_wait)
+            timeout = None
+            if buffer:
+                timeout = max(last_flush + FLUSH_INTERVAL - time.monotonic(), 0)
+            done, _ = await asyncio.wait(
+                waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if cancel_wait in done:
+                outcome = CANCELLED
+                if buffer:
+                    yield sse("token", {"text": "".join(buffer)})
+                yield sse("done", {"cancelled": True})
+                return
+
+            for task in done - {next_chunk}:
+                event, info = pending.pop(task)
+                if event == "task":
+                    yield sse("task", {**info, "result": task.result()})
+                elif task.result():
+                    yield sse("metadata", {info: task.result()})
+
+            if next_chunk in done:
+                markers = []
+                try:
+                    text = next_chunk.result()
+                except StopAsyncIteration:
+                    next_chunk = None
+                    text = parser.flush()
+                    for speculation in speculations:
+                        speculation.discard()
+                except Exception as e:
+                    next_chunk = None
+                    outcome = FAILED
+                    buffer.append(parser.flush())
+                    if "".join(buffer):
+                        yield sse("token", {"text": "".join(buffer)})
+                        buffer = []
+                    yield sse("error", {"message": str(e)})
+                    return
+                else:
+                    next_chunk = asyncio.ensure_future(iterator.__anext__())
+                    if text and generation is not None:
+                        generation.tokens += 1
+                    text, markers = parser.feed(text or "")
+                for task_type, params, raw, offset in markers:
+                    info = {"type": task_type, "params": params, "marker": raw,
+                            "position": displayed + offset, "index": marker_count}
+                    marker_count += 1
+                    for speculation in speculations:
+                        if speculation.task_type == task_type and not speculation.settled:
+                            confirmed = speculation.confirm(params)
+                            if confirmed is not None:
+                                pending[confirmed] = ("metadata", speculation.key)
+                    handler = (handlers or {}).get(task_type)
+                    if handler is None:
+                        yield sse("task", {**info, "result": None})
+                    else:
+                        pending[asyncio.ensure_future(resolve_task(handler, params))] = ("task", info)
+                if text:
+                    buffer.append(text)
+                    buffered += len(text)
+                    displayed += len(text)
+
+            # Flush on the first token, then at most once per interval
+            if buffer and (next_chunk is None or buffered >= FLUSH_CHARS
+                           or time.monotonic() - last_flush >= FLUSH_INTERVAL):
+                yield sse("token", {"text": "".join(buffer)})
+                buffer = []
+                buffered = 0
+                last_flush = time.monotonic()
+
+        outcome = COMPLETED
+        yield sse("done", {})
+    finally:
+        # Cancelling the pending read closes the upstream HTTP stream, which
+        # makes Ollama stop generating; this also runs on client disconnect
+        if next_chunk is not None:
+            next_chunk.cancel()
+        if cancel_wait is not None:
+            cancel_wait.cancel()
+        for task in pending:
+            task.cancel()
+        for speculation in speculations:
+            speculation.discard()
+        if ticket is not None:
+            ticket.release()
+        if generation is not None:
+            generations.finish(generation, outcome)
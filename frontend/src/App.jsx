@@ -22,6 +22,8 @@ function App() {
     stopGenerating,
     newChat,
     loadConversation,
+    loadMoreConversations,
+    hasMoreConversations,
     deleteConversation,
     executeTask,
   } = useChat();
@@ -48,6 +50,8 @@ function App() {
           setSidebarOpen(false);
         }}
         onDeleteConversation={deleteConversation}
+        hasMore={hasMoreConversations}
+        onLoadMore={loadMoreConversations}
         isOpen={sidebarOpen}
         onClose={() => setSidebarOpen(false)}
       />
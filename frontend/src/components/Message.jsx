@@ -19,6 +19,7 @@ export function Message({ message, onExecuteTask }) {
     tasks,
     isStreaming,
     isSearching,
+    queuePosition,
     images,
     sources,
     videoData,
@@ -100,7 +101,11 @@ export function Message({ message, onExecuteTask }) {
               <span className="typing-dot w-1.5 h-1.5 bg-purple-400 rounded-full" />
               <span className="typing-dot w-1.5 h-1.5 bg-purple-400 rounded-full" />
             </div>
-            <span className="text-sm text-gray-500">Thinking...</span>
+            <span className="text-sm text-gray-500">
+              {queuePosition
+                ? `Waiting in queue (position ${queuePosition})...`
+                : "Thinking..."}
+            </span>
           </div>
         )}
 
@@ -130,14 +135,16 @@ export function Message({ message, onExecuteTask }) {
         )}
 
         {/* Task buttons */}
-        {tasks && tasks.length > 0 && !isStreaming && (
+        {tasks && tasks.length > 0 && (
           <div className="flex gap-2 mt-4 flex-wrap">
             {tasks.map((task, index) => (
               <TaskButton
                 key={index}
                 type={task.type}
                 params={task.params}
-                onClick={() => onExecuteTask(task.type, task.params)}
+                onClick={() =>
+                  onExecuteTask(task.type, task.params, task.result)
+                }
               />
             ))}
           </div>
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import {
   PlusIcon,
   ChatBubbleLeftIcon,
@@ -7,6 +7,7 @@ import {
   XMarkIcon,
   SparklesIcon,
 } from "@heroicons/react/24/outline";
+import { api } from "../services/api";
 
 export function Sidebar({
   conversations,
@@ -17,10 +18,48 @@ export function Sidebar({
   onNewChat,
   onSelectConversation,
   onDeleteConversation,
+  hasMore,
+  onLoadMore,
   isOpen,
   onClose,
 }) {
   const [searchQuery, setSearchQuery] = useState("");
+  const [messageResults, setMessageResults] = useState([]);
+  const [nextOffset, setNextOffset] = useState(null);
+
+  // Search message contents on the server once typing pauses
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setMessageResults([]);
+      setNextOffset(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const data = await api.searchConversations(query);
+        if (!cancelled && data.status === "success") {
+          setMessageResults(data.results);
+          setNextOffset(data.next_offset);
+        }
+      } catch (error) {
+        console.error("Search failed:", error);
+      }
+    }, 250);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const loadMoreResults = async () => {
+    const data = await api.searchConversations(searchQuery.trim(), nextOffset);
+    if (data.status === "success") {
+      setMessageResults((prev) => [...prev, ...data.results]);
+      setNextOffset(data.next_offset);
+    }
+  };
 
   const conversationList = Object.entries(conversations);
 
@@ -119,7 +158,7 @@ export function Sidebar({
 
         {/* Conversation List */}
         <div className="flex-1 overflow-y-auto px-2 pb-2 scrollbar-thin">
-          {filteredList.length === 0 ? (
+          {filteredList.length === 0 && messageResults.length === 0 ? (
             <div className="flex flex-col items-center justify-center py-12 px-4">
               <div className="w-12 h-12 rounded-2xl bg-gray-800/50 flex items-center justify-center mb-3">
                 <ChatBubbleLeftIcon className="w-6 h-6 text-gray-600" />
@@ -158,8 +197,31 @@ export function Sidebar({
                 onSelect={onSelectConversation}
                 onDelete={onDeleteConversation}
               />
+              <SearchResults
+                results={messageResults}
+                currentId={currentConversationId}
+                onSelect={onSelectConversation}
+              />
+              {nextOffset !== null && (
+                <button
+                  onClick={loadMoreResults}
+                  className="w-full px-3 py-2 mt-1 rounded-xl text-xs text-gray-500
+                    hover:bg-gray-800/40 hover:text-gray-300 transition-colors"
+                >
+                  More results
+                </button>
+              )}
             </div>
           )}
+          {hasMore && !searchQuery && (
+            <button
+              onClick={onLoadMore}
+              className="w-full px-3 py-2 mt-1 rounded-xl text-xs text-gray-500
+                hover:bg-gray-800/40 hover:text-gray-300 transition-colors"
+            >
+              Load more
+            </button>
+          )}
         </div>
 
         {/* Model Selector */}
@@ -213,6 +275,48 @@ function ConversationGroup({ label, items, currentId, onSelect, onDelete }) {
   );
 }
 
+function SearchResults({ results, currentId, onSelect }) {
+  if (results.length === 0) return null;
+
+  return (
+    <div className="mb-2">
+      <h3 className="text-[11px] font-semibold text-gray-500 uppercase tracking-wider px-3 py-1.5">
+        In messages
+      </h3>
+      {results.map((result) => (
+        <div
+          key={result.id}
+          onClick={() => onSelect(result.id)}
+          className={`
+            px-3 py-2 rounded-xl cursor-pointer transition-all duration-200
+            ${result.id === currentId ? "bg-gray-800/80" : "hover:bg-gray-800/40"}
+          `}
+        >
+          <div className="text-sm text-gray-300 truncate">
+            {result.title || "New conversation"}
+          </div>
+          <div className="text-xs text-gray-500 line-clamp-2 mt-0.5">
+            <Snippet text={result.snippet} />
+          </div>
+        </div>
+      ))}
+    </div>
+  );
+}
+
+// Render a search snippet, highlighting the words between \u0002 and \u0003
+function Snippet({ text }) {
+  return text.split(/\u0002|\u0003/).map((part, index) =>
+    index % 2 === 1 ? (
+      <mark key={index} className="bg-blue-500/20 text-blue-300 rounded px-0.5">
+        {part}
+      </mark>
+    ) : (
+      <span key={index}>{part}</span>
+    ),
+  );
+}
+
 function ConversationItem({ id, title, isActive, onSelect, onDelete }) {
   const [showDelete, setShowDelete] = useState(false);
 
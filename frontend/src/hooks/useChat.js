@@ -10,10 +10,15 @@ export function useChat() {
   const [models, setModels] = useState([]);
   const [currentModel, setCurrentModel] = useState("llama3.2");
   const abortControllerRef = useRef(null);
+  const requestIdRef = useRef(null);
   const messagesRef = useRef([]);
   const convIdRef = useRef(null);
+  const conversationsRef = useRef({});
+  const currentModelRef = useRef("llama3.2");
   // Track pending user message for abort save
   const pendingUserMsgRef = useRef(null);
+  // Last save of an exchange to the server, awaited before the next message
+  const persistingRef = useRef(null);
 
   // Keep refs in sync
   useEffect(() => {
@@ -22,6 +27,12 @@ export function useChat() {
   useEffect(() => {
     convIdRef.current = currentConversationId;
   }, [currentConversationId]);
+  useEffect(() => {
+    conversationsRef.current = conversations;
+  }, [conversations]);
+  useEffect(() => {
+    currentModelRef.current = currentModel;
+  }, [currentModel]);
 
   // Check health periodically
   useEffect(() => {
@@ -56,41 +67,103 @@ export function useChat() {
     loadModels();
   }, []);
 
-  // Load conversations
-  useEffect(() => {
-    const loadConversations = async () => {
-      try {
-        const data = await api.getConversations();
-        if (data.status === "success") {
-          setConversations(data.conversations || {});
-        }
-      } catch (error) {
-        console.error("Failed to load conversations:", error);
+  // Load conversation summaries page by page; messages are fetched when a
+  // conversation is opened
+  const [conversationsCursor, setConversationsCursor] = useState(null);
+
+  const loadConversationPage = useCallback(async (cursor) => {
+    try {
+      const data = await api.listConversations(cursor);
+      if (data.status === "success") {
+        setConversations((prev) => {
+          const updated = { ...prev };
+          for (const summary of data.conversations || []) {
+            const { id, ...rest } = summary;
+            updated[id] = { ...updated[id], ...rest };
+          }
+          return updated;
+        });
+        setConversationsCursor(data.next_cursor || null);
       }
-    };
-    loadConversations();
+    } catch (error) {
+      console.error("Failed to load conversations:", error);
+    }
   }, []);
 
+  useEffect(() => {
+    loadConversationPage(null);
+  }, [loadConversationPage]);
+
+  const loadMoreConversations = useCallback(() => {
+    if (conversationsCursor) {
+      loadConversationPage(conversationsCursor);
+    }
+  }, [conversationsCursor, loadConversationPage]);
+
   const generateId = () =>
     Date.now().toString(36) + Math.random().toString(36).substr(2);
 
-  // Build clean history from current messages for sending to backend
-  const buildHistory = () => {
-    return messagesRef.current
-      .filter((msg) => !msg.isStreaming)
-      .map((msg) => ({
-        role: msg.role,
-        content:
-          msg.role === "assistant"
-            ? removeTaskMarkers(msg.content || "")
-            : msg.content || "",
-      }));
-  };
+  // Append new messages to the server copy of a conversation. The last
+  // version we saw goes along as If-Match; if another tab wrote in between,
+  // adopt the server's copy and append on top of it.
+  const persistMessages = useCallback(async (convId, newMessages) => {
+    const convo = conversationsRef.current[convId] || {};
+    const meta = {
+      title: convo.title,
+      created_at: convo.created_at,
+      model: currentModelRef.current,
+    };
+
+    try {
+      let result = await api.appendMessages(
+        convId,
+        newMessages,
+        meta,
+        convo.version ?? 0,
+      );
+
+      if (result.conflict) {
+        const latest = await api.getConversation(convId);
+        const serverConvo =
+          latest.status === "success" ? latest.conversation : null;
+        result = await api.appendMessages(
+          convId,
+          newMessages,
+          meta,
+          serverConvo ? serverConvo.version : 0,
+        );
+        if (serverConvo && result.status === "success") {
+          setConversations((prev) => ({
+            ...prev,
+            [convId]: {
+              ...serverConvo,
+              messages: [...serverConvo.messages, ...newMessages],
+              version: result.version,
+            },
+          }));
+          return;
+        }
+      }
+
+      if (result.status === "success") {
+        setConversations((prev) => ({
+          ...prev,
+          [convId]: { ...prev[convId], version: result.version },
+        }));
+      }
+    } catch (error) {
+      console.error("Failed to save conversation:", error);
+    }
+  }, []);
 
   // Stop current generation and save partial response to the conversation
   const stopAndSavePartial = useCallback(() => {
     if (!abortControllerRef.current) return;
 
+    if (requestIdRef.current) {
+      api.cancelChat(requestIdRef.current).catch(() => {});
+      requestIdRef.current = null;
+    }
     abortControllerRef.current.abort();
     abortControllerRef.current = null;
 
@@ -102,7 +175,9 @@ export function useChat() {
     const lastMsg = currentMessages[currentMessages.length - 1];
     if (lastMsg && lastMsg.isStreaming) {
       const partialContent = lastMsg.content || "";
-      const tasks = parseTaskMarkers(partialContent);
+      const tasks = lastMsg.tasks?.length
+        ? lastMsg.tasks
+        : parseTaskMarkers(partialContent);
       const cleanContent = removeTaskMarkers(partialContent);
 
       const finalizedMessages = [...currentMessages];
@@ -118,27 +193,24 @@ export function useChat() {
 
       // Save to conversations if we have content
       if (convId && partialContent && userMsg) {
-        setConversations((prev) => {
-          const updated = {
-            ...prev,
-            [convId]: {
-              ...prev[convId],
-              messages: [
-                ...(prev[convId]?.messages || []),
-                userMsg,
-                { role: "assistant", content: partialContent },
-              ],
-            },
-          };
-          api.saveConversations(updated);
-          return updated;
-        });
+        const newMessages = [
+          userMsg,
+          { role: "assistant", content: partialContent },
+        ];
+        setConversations((prev) => ({
+          ...prev,
+          [convId]: {
+            ...prev[convId],
+            messages: [...(prev[convId]?.messages || []), ...newMessages],
+          },
+        }));
+        persistingRef.current = persistMessages(convId, newMessages);
       }
     }
 
     setIsLoading(false);
     pendingUserMsgRef.current = null;
-  }, []);
+  }, [persistMessages]);
 
   const _sendMessageInternal = useCallback(
     async (content, useSearch = false) => {
@@ -160,8 +232,9 @@ export function useChat() {
         }));
       }
 
-      // Build history from current messages BEFORE adding the new ones
-      const history = buildHistory();
+      // The server reads the history from its copy of the conversation, so
+      // the previous exchange must be saved before the next one is sent
+      const saved = persistingRef.current;
 
       // Add user message
       const userMessage = { role: "user", content };
@@ -185,6 +258,8 @@ export function useChat() {
       abortControllerRef.current = controller;
 
       try {
+        await saved;
+
         const onChunk = (text) => {
           setMessages((prev) => {
             const newMessages = [...prev];
@@ -193,6 +268,36 @@ export function useChat() {
               content: text,
               isStreaming: true,
               isSearching: false,
+              queuePosition: 0,
+            };
+            return newMessages;
+          });
+        };
+
+        const onRequestId = (requestId) => {
+          requestIdRef.current = requestId;
+        };
+
+        const onQueue = (queuePosition) => {
+          setMessages((prev) => {
+            const newMessages = [...prev];
+            newMessages[newMessages.length - 1] = {
+              ...newMessages[newMessages.length - 1],
+              queuePosition,
+            };
+            return newMessages;
+          });
+        };
+
+        // Tasks arrive as soon as their marker closes, already resolved
+        let streamedTasks = [];
+        const onTask = (tasks) => {
+          streamedTasks = tasks;
+          setMessages((prev) => {
+            const newMessages = [...prev];
+            newMessages[newMessages.length - 1] = {
+              ...newMessages[newMessages.length - 1],
+              tasks,
             };
             return newMessages;
           });
@@ -236,23 +341,30 @@ export function useChat() {
               content,
               currentModel,
               onChunk,
-              history,
               controller.signal,
               onImages,
               onSources,
               onVideo,
+              convId,
+              onQueue,
+              onRequestId,
+              onTask,
             )
           : await api.streamMessage(
               content,
               currentModel,
               onChunk,
-              history,
               controller.signal,
               onVideo,
+              convId,
+              onQueue,
+              onRequestId,
+              onTask,
             );
 
-        // Parse tasks from response
-        const tasks = parseTaskMarkers(fullResponse);
+        const tasks = streamedTasks.length
+          ? streamedTasks
+          : parseTaskMarkers(fullResponse);
         const cleanContent = removeTaskMarkers(fullResponse);
 
         // Update final message (spread to preserve images)
@@ -265,26 +377,24 @@ export function useChat() {
             tasks,
             isStreaming: false,
             isSearching: false,
+            queuePosition: 0,
           };
           return newMessages;
         });
 
         // Save to conversations
-        setConversations((prev) => {
-          const updated = {
-            ...prev,
-            [convId]: {
-              ...prev[convId],
-              messages: [
-                ...(prev[convId]?.messages || []),
-                userMessage,
-                { role: "assistant", content: fullResponse },
-              ],
-            },
-          };
-          api.saveConversations(updated);
-          return updated;
-        });
+        const newMessages = [
+          userMessage,
+          { role: "assistant", content: fullResponse },
+        ];
+        setConversations((prev) => ({
+          ...prev,
+          [convId]: {
+            ...prev[convId],
+            messages: [...(prev[convId]?.messages || []), ...newMessages],
+          },
+        }));
+        persistingRef.current = persistMessages(convId, newMessages);
       } catch (error) {
         if (error.name === "AbortError") {
           // Handled by stopAndSavePartial — nothing more to do here
@@ -303,10 +413,11 @@ export function useChat() {
       } finally {
         setIsLoading(false);
         abortControllerRef.current = null;
+        requestIdRef.current = null;
         pendingUserMsgRef.current = null;
       }
     },
-    [currentConversationId, currentModel, isLoading],
+    [currentConversationId, currentModel, isLoading, persistMessages],
   );
 
   const sendMessage = useCallback(
@@ -338,13 +449,27 @@ export function useChat() {
   }, [stopAndSavePartial]);
 
   const loadConversation = useCallback(
-    (id) => {
+    async (id) => {
       // If generating, stop and save partial first
       if (abortControllerRef.current) {
         stopAndSavePartial();
       }
 
-      const convo = conversations[id];
+      // Search results can point at conversations from summary pages that
+      // haven't been loaded yet, so an unknown id is fetched too
+      let convo = conversations[id];
+      if (!convo?.messages) {
+        try {
+          const data = await api.getConversation(id);
+          if (data.status !== "success") return;
+          convo = { ...convo, ...data.conversation };
+          setConversations((prev) => ({ ...prev, [id]: convo }));
+        } catch (error) {
+          console.error("Failed to load conversation:", error);
+          return;
+        }
+      }
+
       if (convo) {
         setCurrentConversationId(id);
         setMessages(
@@ -374,9 +499,10 @@ export function useChat() {
     [currentConversationId, newChat],
   );
 
-  const executeTask = useCallback(async (type, params) => {
+  const executeTask = useCallback(async (type, params, resolved) => {
     try {
-      const result = await api.executeTask(type, params);
+      // Tasks streamed with the response were already resolved by the server
+      const result = resolved || (await api.executeTask(type, params));
       if (result.success && result.url) {
         window.open(result.url, "_blank");
       }
@@ -399,6 +525,8 @@ export function useChat() {
     stopGenerating,
     newChat,
     loadConversation,
+    loadMoreConversations,
+    hasMoreConversations: conversationsCursor !== null,
     deleteConversation,
     executeTask,
   };
@@ -1,5 +1,117 @@
 const API_BASE = "/api";
 
+// Read a server-sent event stream from a fetch response and dispatch each
+// event to `handlers[type]` with its parsed data. Only the unfinished tail of
+// the stream is buffered, so cost stays linear in the response size.
+async function readEventStream(response, handlers) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  const dispatch = (frame) => {
+    let type = "message";
+    let data = "";
+    for (const line of frame.split("\n")) {
+      if (line.startsWith("event:")) type = line.slice(6).trim();
+      else if (line.startsWith("data:")) data += line.slice(5).trim();
+    }
+    if (data && handlers[type]) {
+      handlers[type](JSON.parse(data));
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      dispatch(buffer.substring(0, end));
+      buffer = buffer.substring(end + 2);
+    }
+  }
+}
+
+// Stream a chat response. Returns the full response text; metadata, queue
+// position and task events are passed to the matching callbacks as they
+// arrive. Task markers are sent as task events rather than tokens, so they
+// are put back into the text passed to onChunk and returned.
+async function streamChat(path, body, signal, callbacks) {
+  const {
+    onChunk,
+    onImages,
+    onSources,
+    onVideo,
+    onQueue,
+    onRequestId,
+    onTask,
+  } = callbacks;
+  const response = await fetch(`${API_BASE}${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+    signal,
+  });
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || data.message || `Request failed (${response.status})`);
+  }
+
+  let displayed = "";
+  const tasks = [];
+  let streamError = null;
+
+  try {
+    await readEventStream(response, {
+      metadata: (meta) => {
+        if (meta.request_id && onRequestId) onRequestId(meta.request_id);
+        if (meta.images && onImages) onImages(meta.images);
+        if (meta.sources && onSources) onSources(meta.sources);
+        if (meta.video && onVideo) onVideo(meta.video);
+      },
+      queue: ({ position }) => {
+        if (onQueue) onQueue(position);
+      },
+      token: ({ text }) => {
+        displayed += text;
+        onChunk(withTaskMarkers(displayed, tasks));
+      },
+      task: (task) => {
+        tasks.push(task);
+        tasks.sort((a, b) => a.index - b.index);
+        if (onTask) onTask([...tasks]);
+      },
+      error: ({ message }) => {
+        streamError = new Error(message);
+      },
+    });
+  } catch (err) {
+    if (err.name === "AbortError") {
+      // User stopped generation — return what we have so far
+    } else {
+      throw err;
+    }
+  }
+
+  if (streamError) throw streamError;
+  return withTaskMarkers(displayed, tasks);
+}
+
+// Put streamed task markers back at their positions in the displayed text
+export function withTaskMarkers(text, tasks) {
+  let result = text;
+  let offset = 0;
+  for (const task of tasks) {
+    if (!task.marker) continue;
+    const at = task.position + offset;
+    result = result.slice(0, at) + task.marker + result.slice(at);
+    offset += task.marker.length;
+  }
+  return result;
+}
+
 export const api = {
   async checkHealth() {
     const response = await fetch(`${API_BASE}/health`);
@@ -20,148 +132,53 @@ export const api = {
     return response.json();
   },
 
-  async streamMessage(message, model, onChunk, history, signal, onVideo) {
-    const response = await fetch(`${API_BASE}/chat/stream`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message, model, history }),
+  async streamMessage(
+    message,
+    model,
+    onChunk,
+    signal,
+    onVideo,
+    conversationId,
+    onQueue,
+    onRequestId,
+    onTask,
+  ) {
+    return streamChat(
+      "/chat/stream",
+      { message, model, conversation_id: conversationId },
       signal,
-    });
-
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
-    let buffer = "";
-    let fullResponse = "";
-    let prefixParsed = false;
-    const DELIMITER = "\n---STREAM---\n";
-
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        const chunk = decoder.decode(value);
-
-        if (!prefixParsed) {
-          buffer += chunk;
-          const delimIdx = buffer.indexOf(DELIMITER);
-          if (delimIdx !== -1) {
-            // Parse the JSON prefix for video data
-            const prefix = buffer.substring(0, delimIdx);
-            try {
-              const meta = JSON.parse(prefix);
-              if (meta.video && onVideo) {
-                onVideo(meta.video);
-              }
-            } catch {
-              // No prefix or parse failed — treat entire buffer as text
-            }
-            const rest = buffer.substring(delimIdx + DELIMITER.length);
-            prefixParsed = true;
-            if (rest) {
-              fullResponse += rest;
-              onChunk(fullResponse);
-            }
-          } else if (!buffer.startsWith("{")) {
-            // No JSON prefix — plain text stream
-            prefixParsed = true;
-            fullResponse = buffer;
-            onChunk(fullResponse);
-          }
-        } else {
-          fullResponse += chunk;
-          onChunk(fullResponse);
-        }
-      }
-    } catch (err) {
-      if (err.name === "AbortError") {
-        // User stopped generation — return what we have so far
-      } else {
-        throw err;
-      }
-    }
-
-    // If prefix was never parsed (no delimiter found), treat buffer as text
-    if (!prefixParsed) {
-      fullResponse = buffer;
-    }
-
-    return fullResponse;
+      { onChunk, onVideo, onQueue, onRequestId, onTask },
+    );
   },
 
   async searchStream(
     message,
     model,
     onChunk,
-    history,
     signal,
     onImages,
     onSources,
     onVideo,
+    conversationId,
+    onQueue,
+    onRequestId,
+    onTask,
   ) {
-    const response = await fetch(`${API_BASE}/chat/search-stream`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message, model, history }),
+    return streamChat(
+      "/chat/search-stream",
+      { message, model, conversation_id: conversationId },
       signal,
-    });
-
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
-    let buffer = "";
-    let fullResponse = "";
-    let prefixParsed = false;
-    const DELIMITER = "\n---STREAM---\n";
-
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        const chunk = decoder.decode(value);
-
-        if (!prefixParsed) {
-          buffer += chunk;
-          const delimIdx = buffer.indexOf(DELIMITER);
-          if (delimIdx !== -1) {
-            // Parse the JSON prefix for images
-            const prefix = buffer.substring(0, delimIdx);
-            try {
-              const meta = JSON.parse(prefix);
-              if (meta.images && onImages) {
-                onImages(meta.images);
-              }
-              if (meta.sources && onSources) {
-                onSources(meta.sources);
-              }
-              if (meta.video && onVideo) {
-                onVideo(meta.video);
-              }
-            } catch {
-              // Prefix parse failed — ignore images
-            }
-            // Rest after delimiter is the start of the text stream
-            const rest = buffer.substring(delimIdx + DELIMITER.length);
-            prefixParsed = true;
-            if (rest) {
-              fullResponse += rest;
-              onChunk(fullResponse);
-            }
-          }
-        } else {
-          fullResponse += chunk;
-          onChunk(fullResponse);
-        }
-      }
-    } catch (err) {
-      if (err.name === "AbortError") {
-        // User stopped generation
-      } else {
-        throw err;
-      }
-    }
+      { onChunk, onImages, onSources, onVideo, onQueue, onRequestId, onTask },
+    );
+  },
 
-    return fullResponse;
+  // Tell the server to stop generating a response (aborting the fetch alone
+  // may not reach it through a buffering proxy)
+  async cancelChat(requestId) {
+    const response = await fetch(`${API_BASE}/chat/cancel/${requestId}`, {
+      method: "POST",
+    });
+    return response.json();
   },
 
   async search(query) {
@@ -182,6 +199,16 @@ export const api = {
     return response.json();
   },
 
+  // Run several tasks at once; results come back in the same order
+  async executeTasks(tasks) {
+    const response = await fetch(`${API_BASE}/execute-tasks`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ tasks }),
+    });
+    return response.json();
+  },
+
   async clearConversation() {
     const response = await fetch(`${API_BASE}/clear`, { method: "POST" });
     return response.json();
@@ -192,13 +219,50 @@ export const api = {
     return response.json();
   },
 
-  async saveConversations(conversations) {
-    const response = await fetch(`${API_BASE}/conversations`, {
+  // One page of conversation summaries (no messages), newest first
+  async listConversations(cursor, limit = 50) {
+    const params = new URLSearchParams({ view: "summary", limit });
+    if (cursor) params.set("cursor", cursor);
+    const response = await fetch(`${API_BASE}/conversations?${params}`);
+    return response.json();
+  },
+
+  // Search stored messages; snippets mark matched words with \u0002 and \u0003
+  async searchConversations(query, offset = 0, limit = 20) {
+    const params = new URLSearchParams({ q: query, offset, limit });
+    const response = await fetch(`${API_BASE}/conversations/search?${params}`);
+    return response.json();
+  },
+
+  async getConversation(id) {
+    const response = await fetch(`${API_BASE}/conversations/${id}`);
+    return response.json();
+  },
+
+  // Append messages to a conversation. `version` is the last version this
+  // client saw; the server rejects the write with 412 if it has moved on.
+  async appendMessages(id, messages, meta = {}, version) {
+    const headers = { "Content-Type": "application/json" };
+    if (version !== undefined) headers["If-Match"] = `"${version}"`;
+    const response = await fetch(`${API_BASE}/conversations/${id}/messages`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(conversations),
+      headers,
+      body: JSON.stringify({ messages, ...meta }),
     });
-    return response.json();
+    const data = await response.json();
+    return { ...data, conflict: response.status === 412 };
+  },
+
+  async updateConversation(id, fields, version) {
+    const headers = { "Content-Type": "application/json" };
+    if (version !== undefined) headers["If-Match"] = `"${version}"`;
+    const response = await fetch(`${API_BASE}/conversations/${id}`, {
+      method: "PATCH",
+      headers,
+      body: JSON.stringify(fields),
+    });
+    const data = await response.json();
+    return { ...data, conflict: response.status === 412 };
   },
 
   async deleteConversation(id) {
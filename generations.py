@@ -0,0 +1,90 @@
+"""Registry of in-flight generations, so they can be cancelled and measured."""
+
+import asyncio
+import time
+import uuid
+
+# Outcomes a generation can finish with
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+DISCONNECTED = "disconnected"
+FAILED = "failed"
+
+
+class Generation:
+    """One streamed response, identified by a ``request_id`` the client can cancel by."""
+
+    def __init__(self, model):
+        self.request_id = uuid.uuid4().hex
+        self.model = model
+        self.started_at = time.monotonic()
+        self.tokens = 0
+        self.cancelled = asyncio.Event()
+
+    def cancel(self):
+        """Ask the stream to stop; it closes the upstream request at its next step."""
+        self.cancelled.set()
+
+
+class GenerationRegistry:
+    """
+    Tracks running generations and counts how they end.
+
+    Ollama streams one token per chunk, so chunk counts are token counts.
+    The tokens a stopped generation would still have produced are estimated
+    from the average length of the model's completed responses.
+    """
+
+    def __init__(self):
+        self._active = {}
+        self._avg_tokens = {}
+        self.outcomes = {COMPLETED: 0, CANCELLED: 0, DISCONNECTED: 0, FAILED: 0}
+        self.tokens_generated = 0
+        self.tokens_saved = 0
+
+    def start(self, model):
+        """Register a new generation."""
+        generation = Generation(model)
+        self._active[generation.request_id] = generation
+        return generation
+
+    def cancel(self, request_id):
+        """
+        Cancel a running generation.
+
+        Returns:
+            False if no generation has that id (it may have finished already)
+        """
+        generation = self._active.get(request_id)
+        if generation is None:
+            return False
+        generation.cancel()
+        return True
+
+    def finish(self, generation, outcome):
+        """Unregister a generation and record how it ended."""
+        if self._active.pop(generation.request_id, None) is None:
+            return
+        self.outcomes[outcome] += 1
+        self.tokens_generated += generation.tokens
+        average = self._avg_tokens.get(generation.model)
+        if outcome == COMPLETED:
+            self._avg_tokens[generation.model] = (
+                generation.tokens if average is None
+                else average + (generation.tokens - average) * 0.1
+            )
+        elif outcome in (CANCELLED, DISCONNECTED) and average is not None:
+            self.tokens_saved += max(round(average) - generation.tokens, 0)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            'active': len(self._active),
+            **self.outcomes,
+            'tokens_generated': self.tokens_generated,
+            'estimated_tokens_saved': self.tokens_saved,
+        }
+
+
+# Shared by the streaming endpoints
+generations = GenerationRegistry()
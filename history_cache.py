@@ -0,0 +1,153 @@
+"""Per-conversation model context, kept up to date as messages are appended."""
+
+import os
+import threading
+from collections import deque
+
+from cache import TTLCache
+from main import remove_task_markers
+
+# Conversations whose prepared context is kept in memory, and for how long
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", 512))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", 3600))
+
+
+def clean_message(msg):
+    """A stored message as model context: role and content, task markers removed."""
+    role = msg.get('role', 'user')
+    content = msg.get('content', '') or ''
+    if role == 'assistant':
+        content = remove_task_markers(content)
+    return {'role': role, 'content': content}
+
+
+class HistoryCache:
+    """
+    The cleaned recent messages of each active conversation.
+
+    A conversation's messages are read from the store and cleaned once;
+    after that, appends through this server are added to the cached copy
+    directly. Every read compares the stored version with the cached one,
+    so writes made elsewhere (another worker process) are picked up by
+    fetching just the new messages.
+
+    Thread-safe, so reads can run in worker threads off the event loop.
+    """
+
+    def __init__(self, store, summarizer, max_messages: int,
+                 maxsize: int = HISTORY_CACHE_SIZE, ttl: float = HISTORY_CACHE_TTL):
+        """
+        Args:
+            store: ConversationStore holding the messages
+            summarizer: Summarizer whose summary replaces older messages
+            max_messages: Most recent messages kept per conversation
+            maxsize: Conversations kept in memory
+            ttl: Seconds an unused conversation is kept
+        """
+        self.store = store
+        self.summarizer = summarizer
+        self.max_messages = max_messages
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.catch_ups = 0
+        self.appends = 0
+
+    def _load(self, conversation_id):
+        convo = self.store.get(conversation_id, offset=-self.max_messages)
+        if convo is None:
+            self._entries.delete(conversation_id)
+            return None
+        entry = {
+            'version': convo['version'],
+            'count': convo['message_count'],
+            'messages': deque(
+                (clean_message(msg) for msg in convo['messages']), maxlen=self.max_messages
+            ),
+        }
+        self._entries.set(conversation_id, entry)
+        self.loads += 1
+        return entry
+
+    def _current(self, conversation_id):
+        """The cached entry, brought up to date with the store."""
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return self._load(conversation_id)
+
+        latest = self.store.get(conversation_id, limit=0)
+        if latest is None:
+            self._entries.delete(conversation_id)
+            return None
+        if latest['version'] == entry['version']:
+            return entry
+        if latest['message_count'] < entry['count']:
+            # History was rewritten
+            return self._load(conversation_id)
+
+        new = self.store.get(conversation_id, offset=entry['count'])
+        entry['messages'].extend(clean_message(msg) for msg in new['messages'])
+        entry['count'] = new['offset'] + len(new['messages'])
+        entry['version'] = new['version']
+        self.catch_ups += 1
+        return entry
+
+    def get(self, conversation_id):
+        """
+        Get a conversation's context for the model.
+
+        Returns:
+            Tuple of (summary of older turns, cleaned message history after it,
+            position of the history's first message in the conversation)
+        """
+        if not conversation_id:
+            return "", [], 0
+        summary, covered = self.summarizer.summary_for(conversation_id)
+        with self._lock:
+            entry = self._current(conversation_id)
+            if entry is None:
+                return "", [], 0
+            first = entry['count'] - len(entry['messages'])
+            messages = list(entry['messages'])
+        skip = max(covered - first, 0)
+        return summary, messages[skip:], first + skip
+
+    def appended(self, conversation_id, messages, version):
+        """
+        Record a write made through this server.
+
+        Args:
+            conversation_id: Conversation written to
+            messages: Messages appended (empty for e.g. a rename)
+            version: The conversation's version after the write
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if version != entry['version'] + 1:
+                # Another write came in between; reload on next use
+                self._entries.delete(conversation_id)
+                return
+            entry['messages'].extend(clean_message(msg) for msg in messages)
+            entry['count'] += len(messages)
+            entry['version'] = version
+            self.appends += 1
+
+    def invalidate(self, conversation_id=None):
+        """Drop one conversation, or every conversation if none is given."""
+        with self._lock:
+            if conversation_id is None:
+                self._entries.clear()
+            else:
+                self._entries.delete(conversation_id)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            'size': len(self._entries),
+            'hits': self._entries.hits,
+            'loads': self.loads,
+            'catch_ups': self.catch_ups,
+            'appends': self.appends,
+        }
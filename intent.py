@@ -0,0 +1,139 @@
+"""Single-pass keyword classification of user messages."""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+# Keyword lists per category. Matching is plain substring matching on the
+# lowercased message, so e.g. "now" also matches "know".
+KEYWORDS = {
+    'youtube': ['play', 'youtube', 'music', 'song', 'video', 'watch', 'listen'],
+    'email': ['email', 'mail', 'send', 'compose', 'write to', 'message to'],
+    'search': ['search', 'look up', 'find', 'google', 'search for'],
+    'url': ['open', 'go to', 'visit', 'navigate to', '.com', '.org', '.net', 'website'],
+    'time': ['time', 'date', 'today', 'now', 'current'],
+    # Suggest that images would help
+    'visual': [
+        'who is', 'who was', 'who were',
+        'show me', 'picture of', 'photo of', 'images of', 'look like', 'looks like',
+        'where is', 'where are',
+        'celebrity', 'actor', 'actress', 'singer', 'player', 'athlete',
+        'flag of', 'logo of', 'brand',
+        'mountain', 'beach', 'island',
+        'painting', 'artwork',
+    ],
+    # Suggest no images (abstract/conceptual); these win over 'visual'
+    'no_image': [
+        'what is', 'what are', 'how to', 'why', 'explain', 'define',
+        'difference between', 'meaning of', 'tutorial', 'guide',
+        'code', 'programming', 'error', 'bug', 'fix',
+        'best way', 'how can i', 'should i', 'help me',
+        'calculate', 'convert', 'translate',
+        'who are you', 'your name', 'your creator', 'who made you', 'who built you',
+        'create', 'generate', 'make me', 'draw', 'write',
+        'can you', 'do you', 'are you', 'tell me',
+    ],
+    # Words at least one of the YouTube request patterns below needs
+    'play': ['play'],
+    'open_watch_listen': ['open', 'watch', 'listen'],
+}
+
+HINTS = {
+    'youtube': "User might want to play something on YouTube",
+    'email': "User might want to compose an email",
+    'search': "User might want to search the web",
+    'url': "User might want to open a website",
+}
+
+# Tried in order; the first with a non-empty search term wins. Each only
+# runs if the message contains the keyword category it requires.
+YOUTUBE_PATTERNS = [
+    ('play', re.compile(r'play\s+(.+?)(?:\s+on\s+youtube)?$')),
+    ('play', re.compile(r'play\s+(.+?)(?:\s+on\s+yt)?$')),
+    ('open_watch_listen', re.compile(r'(?:open|watch|listen\s+to)\s+(.+?)(?:\s+on\s+youtube)?$')),
+    ('youtube', re.compile(r'youtube\s+(.+)')),
+    ('youtube', re.compile(r'(.+?)\s+on\s+youtube')),
+]
+_TRAILING_SITE = re.compile(r'\s+on\s+(youtube|yt)$')
+
+
+def _build_matcher(keywords):
+    """
+    Compile every keyword into one regex plus a keyword -> categories map.
+
+    The alternation sits in a lookahead so matches may overlap, and lists
+    longer keywords first so each position yields its longest keyword.
+    Any shorter keyword found at the same position is a prefix of that one,
+    so each keyword also carries the categories of its prefixes. Together
+    this finds exactly the categories whose keywords occur as substrings.
+    """
+    categories = {}
+    for category, words in keywords.items():
+        for word in words:
+            categories.setdefault(word, set()).add(category)
+    closure = {
+        word: frozenset().union(*(cats for other, cats in categories.items() if word.startswith(other)))
+        for word in categories
+    }
+    ordered = sorted(closure, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(word) for word in ordered) + "))")
+    return pattern, closure
+
+
+_PATTERN, _CATEGORIES = _build_matcher(KEYWORDS)
+
+
+def match_categories(text: str) -> frozenset:
+    """Categories with at least one keyword in ``text`` (already lowercased)."""
+    found = set()
+    for match in _PATTERN.finditer(text):
+        found |= _CATEGORIES[match.group(1)]
+    return frozenset(found)
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    """What a user message seems to ask for."""
+    categories: frozenset = field(default_factory=frozenset)
+    youtube_query: Optional[str] = None
+
+    @property
+    def mentions_time(self) -> bool:
+        """Whether the current date and time should be added to the prompt."""
+        return 'time' in self.categories
+
+    @property
+    def wants_images(self) -> bool:
+        """Whether image results would likely help (people, places, objects)."""
+        return 'visual' in self.categories and 'no_image' not in self.categories
+
+    @property
+    def hints(self) -> list[str]:
+        """Task hints for the model, in a fixed order."""
+        return [hint for category, hint in HINTS.items() if category in self.categories]
+
+
+def _youtube_query(q, categories):
+    for required, pattern in YOUTUBE_PATTERNS:
+        if required not in categories:
+            continue
+        match = pattern.search(q)
+        if match:
+            search_term = _TRAILING_SITE.sub('', match.group(1).strip()).strip()
+            if search_term:
+                return search_term
+    return None
+
+
+@lru_cache(maxsize=1024)
+def classify(query: str) -> QueryIntent:
+    """
+    Classify a message for every intent in one scan.
+
+    Results are cached, so the several callers handling one request share
+    a single classification.
+    """
+    q = query.lower().strip()
+    categories = match_categories(q)
+    return QueryIntent(categories=categories, youtube_query=_youtube_query(q, categories))
@@ -2,7 +2,13 @@
 
 import ollama
 import datetime
+import json
+import os
 import re
+from cache import TTLCache
+from context import context_window, fit_history, history_budget
+from intent import classify
+from ollama_pool import pool
 
 # System prompt with task awareness
 SYSTEM_PROMPT = """You are ChatFreeGPT, a friendly and helpful AI assistant with browser automation capabilities.
@@ -59,6 +65,50 @@ Response: Opening GitHub for you!
 - When web search results are provided in the context, synthesize the information and cite sources with URLs"""
 
 
+# "stable" keeps the system prompt and history byte-identical from turn to
+# turn so Ollama can reuse its cached prompt prefix, and puts everything that
+# changes per turn (date, hints, search results) at the end of the last user
+# message. "legacy" appends search results to the system prompt.
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "stable").lower()
+
+# In the stable layout old messages are dropped this many at a time, so the
+# history prefix only changes every few turns once the budget is reached
+HISTORY_ALIGN = int(os.getenv("HISTORY_ALIGN", 8))
+
+# How long Ollama keeps a model (and its prompt cache) loaded after a request,
+# e.g. "30m" or "-1" for forever; unset uses the server default
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE") or None
+
+# Extra generation options as JSON, e.g. '{"num_ctx": 8192}'
+try:
+    OLLAMA_OPTIONS = json.loads(os.getenv("OLLAMA_OPTIONS") or "{}")
+except ValueError as e:
+    print(f"Ignoring invalid OLLAMA_OPTIONS: {e}")
+    OLLAMA_OPTIONS = {}
+
+# DuckDuckGo result cache shared by text and image searches
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", 512)),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", 600)),
+    path=os.getenv("SEARCH_CACHE_FILE") or None,
+)
+
+
+class ModelError(Exception):
+    """Raised when Ollama cannot produce a response."""
+
+
+def _model_error(e, model):
+    """Wrap an Ollama failure in a ModelError with a hint for the user."""
+    if isinstance(e, ollama.ResponseError):
+        return ModelError(
+            f"{e.error}. Make sure Ollama is running and the model '{model}' is installed."
+        )
+    return ModelError(
+        f"Could not connect to Ollama: {str(e)}. Make sure Ollama is running (ollama serve)."
+    )
+
+
 def get_current_datetime():
     """Get formatted current date and time."""
     now = datetime.datetime.now()
@@ -70,63 +120,90 @@ def detect_task_intent(query):
     Detect if the query contains task-related intent.
     Returns hints to help the AI understand the context.
     """
-    query_lower = query.lower()
+    return classify(query).hints
+
+
+def num_ctx(model):
+    """
+    Context window a chat request is sent with.
 
-    hints = []
+    ``num_ctx`` from OLLAMA_OPTIONS if set, otherwise the model's
+    configured window (CONTEXT_WINDOW / MODEL_CONTEXT_WINDOWS). The history
+    budget uses the same number, so Ollama never has to cut the prompt,
+    which it does from the front, system prompt first.
+    """
+    return int(OLLAMA_OPTIONS.get('num_ctx') or context_window(model))
 
-    # YouTube detection
-    youtube_patterns = ['play', 'youtube', 'music', 'song', 'video', 'watch', 'listen']
-    if any(pattern in query_lower for pattern in youtube_patterns):
-        hints.append("User might want to play something on YouTube")
 
-    # Email detection
-    email_patterns = ['email', 'mail', 'send', 'compose', 'write to', 'message to']
-    if any(pattern in query_lower for pattern in email_patterns):
-        hints.append("User might want to compose an email")
+def chat_kwargs(model=""):
+    """Keep-alive and generation options passed with every chat request."""
+    kwargs = {}
+    if OLLAMA_KEEP_ALIVE is not None:
+        kwargs['keep_alive'] = OLLAMA_KEEP_ALIVE
+    options = {**OLLAMA_OPTIONS, 'num_ctx': num_ctx(model)} if model else OLLAMA_OPTIONS
+    if options:
+        kwargs['options'] = options
+    return kwargs
 
-    # Search detection
-    search_patterns = ['search', 'look up', 'find', 'google', 'search for']
-    if any(pattern in query_lower for pattern in search_patterns):
-        hints.append("User might want to search the web")
 
-    # URL detection
-    url_patterns = ['open', 'go to', 'visit', 'navigate to', '.com', '.org', '.net', 'website']
-    if any(pattern in query_lower for pattern in url_patterns):
-        hints.append("User might want to open a website")
+def _build_messages(query, history=None, extra_system="", model="", summary="", layout=None,
+                    history_start=0):
+    """
+    Build the messages list for Ollama from history and current query.
 
-    return hints
+    History is trimmed to the model's token budget (newest messages first)
+    rather than to a fixed message count. A summary of older turns, if
+    given, is placed right after the system prompt.
 
+    In the stable layout (see ``PROMPT_LAYOUT``) ``extra_system`` is added
+    after the query instead of to the system prompt, so only the last
+    message differs from the previous turn's prompt. ``history_start`` is
+    the position of ``history[0]`` in the conversation, so old messages are
+    dropped at the same points however much history the caller passes.
+    """
+    stable = (layout or PROMPT_LAYOUT) == "stable"
 
-def _build_messages(query, history=None, extra_system=""):
-    """Build the messages list for Ollama from history and current query."""
     # Check for time/date queries to inject current info
-    query_lower = query.lower()
+    intent = classify(query)
     context_info = ""
-    if any(word in query_lower for word in ['time', 'date', 'today', 'now', 'current']):
+    if intent.mentions_time:
         context_info = f"\n[Context: {get_current_datetime()}]"
 
     # Detect task intents
-    task_hints = detect_task_intent(query)
+    task_hints = intent.hints
     if task_hints:
         context_info += f"\n[Hints: {'; '.join(task_hints)}]"
 
     system_content = SYSTEM_PROMPT
+    user_content = query + context_info
     if extra_system:
-        system_content += "\n\n" + extra_system
-
+        if stable:
+            user_content += "\n\n" + extra_system
+        else:
+            system_content += "\n\n" + extra_system
     messages = [{"role": "system", "content": system_content}]
 
-    # Add conversation history (limit to last 20 messages)
+    summary_content = ""
+    if summary:
+        summary_content = f"Summary of the earlier conversation:\n{summary}"
+        messages.append({"role": "system", "content": summary_content})
+
+    # Add as much conversation history as fits the context window
     if history:
-        messages.extend(history[-20:])
+        budget = history_budget(
+            model, system_content, summary_content, user_content, window=num_ctx(model)
+        )
+        messages.extend(fit_history(
+            history, budget, model, HISTORY_ALIGN if stable else 1, first=history_start
+        ))
 
     # Add current user message
-    messages.append({"role": "user", "content": query + context_info})
+    messages.append({"role": "user", "content": user_content})
 
     return messages
 
 
-def process_query(query, model="llama3.2", history=None):
+def process_query(query, model="llama3.2", history=None, summary="", history_start=0):
     """
     Process user query using Ollama with task detection.
 
@@ -134,54 +211,67 @@ def process_query(query, model="llama3.2", history=None):
         query: User's input message
         model: Ollama model to use
         history: List of previous messages [{role, content}, ...]
+        summary: Summary of conversation turns older than ``history``
+        history_start: Position of ``history[0]`` in the conversation
 
     Returns:
         AI-generated response string (may include task markers)
     """
     try:
-        messages = _build_messages(query, history)
+        messages = _build_messages(
+            query, history, model=model, summary=summary, history_start=history_start
+        )
 
-        response = ollama.chat(
+        response = pool.call(
+            'chat',
             model=model,
-            messages=messages
+            messages=messages,
+            **chat_kwargs(model)
         )
 
         return response['message']['content']
 
-    except ollama.ResponseError as e:
-        return f"Error: {e.error}. Make sure Ollama is running and the model '{model}' is installed."
     except Exception as e:
-        return f"Error connecting to Ollama: {str(e)}. Make sure Ollama is running (ollama serve)."
+        return f"Error: {_model_error(e, model)}"
 
 
-def process_query_stream(query, model="llama3.2", history=None, extra_system=""):
+async def process_query_stream(query, model="llama3.2", history=None, extra_system="", summary="",
+                               history_start=0):
     """
-    Process user query with streaming response.
+    Process user query with streaming response (async, shares the event loop).
 
     Args:
         query: User's input message
         model: Ollama model to use
         history: List of previous messages [{role, content}, ...]
         extra_system: Additional system context (e.g. web search results)
+        summary: Summary of conversation turns older than ``history``
+        history_start: Position of ``history[0]`` in the conversation
 
     Yields:
         Response chunks as they arrive
+
+    Raises:
+        ModelError: If Ollama fails before or during generation
     """
     try:
-        messages = _build_messages(query, history, extra_system)
+        messages = _build_messages(
+            query, history, extra_system, model=model, summary=summary, history_start=history_start
+        )
 
-        stream = ollama.chat(
+        stream = pool.astream(
+            'chat',
             model=model,
             messages=messages,
-            stream=True
+            **chat_kwargs(model)
         )
 
-        for chunk in stream:
+        async for chunk in stream:
             if 'message' in chunk and 'content' in chunk['message']:
                 yield chunk['message']['content']
 
     except Exception as e:
-        yield f"Error: {str(e)}"
+        raise _model_error(e, model) from e
 
 
 def remove_task_markers(text):
@@ -209,15 +299,22 @@ def clear_conversation():
 def list_models():
     """List available Ollama models."""
     try:
-        result = ollama.list()
+        # Every server is expected to have the same models; the first to answer wins
+        result = pool.call('list')
         return [model.model for model in result.models]
     except Exception as e:
         return f"Error listing models: {str(e)}"
 
 
+def search_cache_key(kind, query, max_results):
+    """Cache key for a search: case, punctuation and spacing differences don't matter."""
+    normalized = ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+    return f"{kind}:{max_results}:{normalized}"
+
+
 def web_search(query, max_results=5):
     """
-    Search the web using DuckDuckGo.
+    Search the web using DuckDuckGo (results are cached).
 
     Args:
         query: Search query string
@@ -226,10 +323,16 @@ def web_search(query, max_results=5):
     Returns:
         List of dicts with title, url, body keys
     """
+    key = search_cache_key("text", query, max_results)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
         from ddgs import DDGS
         with DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
+            search_cache.set(key, results)
             return results
     except Exception as e:
         return [{"title": "Search Error", "url": "", "body": str(e)}]
@@ -237,7 +340,7 @@ def web_search(query, max_results=5):
 
 def web_search_images(query, max_results=4):
     """
-    Search for images using DuckDuckGo.
+    Search for images using DuckDuckGo (results are cached).
 
     Args:
         query: Search query string
@@ -246,11 +349,16 @@ def web_search_images(query, max_results=4):
     Returns:
         List of dicts with title, image, thumbnail, source keys
     """
+    key = search_cache_key("images", query, max_results)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
         from ddgs import DDGS
         with DDGS() as ddgs:
             results = list(ddgs.images(query, max_results=max_results))
-            return [
+            images = [
                 {
                     "title": r.get("title", ""),
                     "image": r.get("image", ""),
@@ -259,6 +367,8 @@ def web_search_images(query, max_results=4):
                 }
                 for r in results
             ]
+            search_cache.set(key, images)
+            return images
     except Exception:
         return []
 
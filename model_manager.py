@@ -0,0 +1,168 @@
+"""Keeps chosen Ollama models loaded so first messages don't wait on a model load."""
+
+import asyncio
+import os
+import time
+
+from ollama_pool import pool
+
+# Models kept loaded besides the default model, e.g. "mistral,qwen2.5"
+WARM_MODELS = [m.strip() for m in os.getenv("WARM_MODELS", "").split(',') if m.strip()]
+
+# Load the warm models when the server starts
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "true").lower() == "true"
+
+# Every ping asks Ollama to keep the model loaded this long. The interval
+# stays below Ollama's default 5 minute keep-alive, which a chat request
+# without its own keep_alive resets the model to.
+MODEL_KEEP_ALIVE = os.getenv("MODEL_KEEP_ALIVE") or os.getenv("OLLAMA_KEEP_ALIVE") or "30m"
+MODEL_PING_INTERVAL = float(os.getenv("MODEL_PING_INTERVAL", 240))
+
+
+class ModelManager:
+    """
+    Tracks which models Ollama has loaded and keeps a warm set resident.
+
+    Warm models are loaded in the background at startup and then pinged
+    with an empty prompt (which loads the model if needed and renews its
+    keep-alive, without generating anything) every ``interval`` seconds.
+    Pings go to every server in the pool. A model counts as resident if
+    any server's ``ps`` lists it; residency is refreshed on each ping.
+    """
+
+    def __init__(self, default_model, warm_models=None, keep_alive=MODEL_KEEP_ALIVE,
+                 interval=MODEL_PING_INTERVAL, preload=MODEL_PRELOAD):
+        """
+        Args:
+            default_model: Model loaded first
+            warm_models: Other models to keep loaded (defaults to WARM_MODELS)
+            keep_alive: Keep-alive requested with every ping
+            interval: Seconds between pings
+            preload: Whether to load the warm set at startup
+        """
+        warm = [default_model] + list(WARM_MODELS if warm_models is None else warm_models)
+        self.default_model = default_model
+        self.warm = list(dict.fromkeys(m for m in warm if m))
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.preload = preload
+        self.resident = {}
+        self.load_times = {}
+        self.loaded_at = {}
+        self.errors = 0
+        self.last_refresh = None
+        self._loading = {}
+        self._task = None
+
+    def start(self):
+        """Start the background warm-up and ping loop."""
+        if self._task is None and self.warm:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        if not self.preload:
+            await asyncio.sleep(self.interval)
+        while True:
+            for model in self.warm:
+                await self.ensure_loaded(model)
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        """Update the resident model list from Ollama."""
+        resident = {}
+        answered = False
+        for backend, response in await pool.each('ps'):
+            if isinstance(response, Exception):
+                self.errors += 1
+                print(f"Error checking loaded models on {backend.stats()['host']}: {response}")
+                continue
+            answered = True
+            for m in response.models:
+                if m.model:
+                    resident.setdefault(m.model, {
+                        'expires_at': m.expires_at.isoformat() if m.expires_at else None,
+                        'size_vram': m.size_vram or 0,
+                        'hosts': [],
+                    })['hosts'].append(backend.stats()['host'])
+        if answered:
+            self.resident = resident
+            self.last_refresh = time.time()
+
+    async def ensure_loaded(self, model):
+        """
+        Load a model (or renew its keep-alive) without generating anything.
+
+        Concurrent calls for the same model share one request.
+
+        Returns:
+            True if the model is loaded
+        """
+        task = self._loading.get(model)
+        if task is None:
+            task = asyncio.create_task(self._load(model))
+            self._loading[model] = task
+            task.add_done_callback(lambda _: self._loading.pop(model, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, model):
+        started = time.monotonic()
+        responses = []
+        for backend, response in await pool.each('generate', model=model, prompt="", keep_alive=self.keep_alive):
+            if isinstance(response, Exception):
+                self.errors += 1
+                print(f"Error loading model {model} on {backend.stats()['host']}: {response}")
+            else:
+                responses.append(response)
+        if not responses:
+            return False
+        # load_duration is only significant when the model was not yet in memory
+        load_duration = max((r.get('load_duration') or 0) for r in responses) / 1e9
+        if self._resident(model) is None or model not in self.load_times:
+            self.load_times[model] = round(load_duration or time.monotonic() - started, 3)
+            self.loaded_at[model] = time.time()
+            self.resident.setdefault(model, {'expires_at': None, 'size_vram': 0, 'hosts': []})
+        return True
+
+    def _resident(self, model):
+        # Ollama reports untagged names with their implicit ":latest" tag
+        if ':' in model:
+            return self.resident.get(model)
+        return self.resident.get(model) or self.resident.get(f"{model}:latest")
+
+    def status(self, model) -> dict:
+        """Residency and load time for one model."""
+        resident = self._resident(model)
+        return {
+            'resident': resident is not None,
+            'warm': model in self.warm,
+            'expires_at': resident['expires_at'] if resident else None,
+            'size_vram': resident['size_vram'] if resident else 0,
+            'hosts': resident['hosts'] if resident else [],
+            'load_time': self.load_times.get(model),
+            'loaded_at': self.loaded_at.get(model),
+        }
+
+    def stats(self) -> dict:
+        """Summary for monitoring."""
+        return {
+            'default_model': self.default_model,
+            'default_model_resident': self.status(self.default_model)['resident'],
+            'warm_models': self.warm,
+            'resident': sorted(self.resident),
+            'load_times': self.load_times,
+            'keep_alive': self.keep_alive,
+            'ping_interval': self.interval,
+            'last_refresh': self.last_refresh,
+            'errors': self.errors,
+        }
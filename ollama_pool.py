@@ -0,0 +1,248 @@
+"""Pool of Ollama servers with load balancing, failover and health tracking."""
+
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+import ollama
+
+# Ollama servers to spread requests over, e.g.
+# "http://gpu1:11434,http://gpu2:11434"; defaults to OLLAMA_HOST (or localhost)
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", "").split(',') if h.strip()]
+
+# Upper bound on simultaneous connections to each server (httpx defaults to 100)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", 512))
+
+# A server failing this many requests in a row is skipped for OLLAMA_EJECT_SECONDS
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", 3))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", 30))
+
+# How many other servers a failed request is retried on
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", 1))
+
+
+def _retryable(e):
+    """Whether a failure is the server's fault (unreachable or 5xx) rather than the request's."""
+    if isinstance(e, ollama.ResponseError):
+        return e.status_code >= 500
+    return isinstance(e, (ConnectionError, httpx.TransportError))
+
+
+class Backend:
+    """One Ollama server with persistent clients and request counters."""
+
+    def __init__(self, host, max_connections):
+        self.host = host
+        self.max_connections = max_connections
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._client = None
+        self._async_client = None
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+
+    def client(self):
+        """Blocking client, created on first use."""
+        if self._client is None:
+            self._client = ollama.Client(host=self.host, limits=self._limits())
+        return self._client
+
+    def async_client(self):
+        """Async client, created on first use."""
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient(host=self.host, limits=self._limits())
+        return self._async_client
+
+    @property
+    def healthy(self):
+        return self.ejected_until <= time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            'host': self.host or os.getenv("OLLAMA_HOST") or "http://127.0.0.1:11434",
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'errors': self.errors,
+            'consecutive_failures': self.failures,
+        }
+
+
+class OllamaPool:
+    """
+    Routes Ollama requests to the server with the fewest requests in flight.
+
+    A server that fails ``eject_after`` requests in a row (connection
+    errors or 5xx responses) is skipped for ``eject_seconds``; after that
+    it gets traffic again, and one more failure ejects it again. Failed
+    requests are retried on up to ``retries`` other servers. Streams are
+    only retried if nothing has been received yet.
+    """
+
+    def __init__(self, hosts=None, max_connections=OLLAMA_MAX_CONNECTIONS,
+                 eject_after=OLLAMA_EJECT_AFTER, eject_seconds=OLLAMA_EJECT_SECONDS,
+                 retries=OLLAMA_RETRIES):
+        """
+        Args:
+            hosts: Server URLs (defaults to OLLAMA_HOSTS; None means OLLAMA_HOST)
+            max_connections: Connection limit per server
+            eject_after: Consecutive failures before a server is skipped
+            eject_seconds: How long an ejected server is skipped
+            retries: Other servers tried after a failure
+        """
+        self.backends = [Backend(host, max_connections) for host in (hosts or OLLAMA_HOSTS or [None])]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.retries = retries
+        self._lock = threading.Lock()
+
+    def _acquire(self, exclude):
+        """Pick the least busy healthy server not yet tried, and count the request."""
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            if not candidates:
+                return None
+            # With every server ejected, trying one beats failing outright
+            backend = min(
+                [b for b in candidates if b.healthy] or candidates,
+                key=lambda b: (b.outstanding, b.requests),
+            )
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _release(self, backend, error=None):
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None or not _retryable(error):
+                backend.failures = 0
+                return
+            backend.errors += 1
+            backend.failures += 1
+            if backend.failures >= self.eject_after:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+        if backend.failures == self.eject_after:
+            print(f"Ollama server {backend.stats()['host']} ejected for {self.eject_seconds}s: {error}")
+
+    def call(self, method, **kwargs):
+        """Call a blocking client method (e.g. ``"chat"``) with failover."""
+        tried = set()
+        error = None
+        for _ in range(self.retries + 1):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            try:
+                result = getattr(backend.client(), method)(**kwargs)
+            except Exception as e:
+                self._release(backend, e)
+                if not _retryable(e):
+                    raise
+                tried.add(backend)
+                error = e
+                continue
+            self._release(backend)
+            return result
+        raise error
+
+    async def acall(self, method, **kwargs):
+        """Call an async client method (e.g. ``"chat"``) with failover."""
+        tried = set()
+        error = None
+        for _ in range(self.retries + 1):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            try:
+                result = await getattr(backend.async_client(), method)(**kwargs)
+            except Exception as e:
+                self._release(backend, e)
+                if not _retryable(e):
+                    raise
+                tried.add(backend)
+                error = e
+                continue
+            self._release(backend)
+            return result
+        raise error
+
+    async def astream(self, method, **kwargs):
+        """
+        Stream an async client method's chunks with failover.
+
+        The server counts as busy until the stream is exhausted or closed.
+        """
+        tried = set()
+        error = None
+        for _ in range(self.retries + 1):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            received = False
+            failure = None
+            try:
+                async for chunk in await getattr(backend.async_client(), method)(stream=True, **kwargs):
+                    received = True
+                    yield chunk
+                return
+            except Exception as e:
+                failure = e
+                if received or not _retryable(e):
+                    raise
+                tried.add(backend)
+                error = e
+            finally:
+                self._release(backend, failure)
+        raise error
+
+    async def each(self, method, **kwargs):
+        """
+        Call an async client method on every server.
+
+        Returns:
+            List of (backend, result) pairs; result is the exception on failure
+        """
+        async def one(backend):
+            try:
+                return backend, await getattr(backend.async_client(), method)(**kwargs)
+            except Exception as e:
+                return backend, e
+
+        return await asyncio.gather(*(one(b) for b in self.backends))
+
+    async def check(self):
+        """
+        Probe every server and update its health.
+
+        Returns:
+            True if at least one server answered
+        """
+        healthy = False
+        for backend, result in await self.each('list'):
+            with self._lock:
+                if isinstance(result, Exception):
+                    backend.errors += 1
+                    backend.failures = max(backend.failures + 1, self.eject_after)
+                    backend.ejected_until = time.monotonic() + self.eject_seconds
+                else:
+                    backend.failures = 0
+                    backend.ejected_until = 0.0
+                    healthy = True
+        return healthy
+
+    def stats(self) -> list:
+        """Per-server counters for monitoring."""
+        return [b.stats() for b in self.backends]
+
+
+# Shared by every module that talks to Ollama
+pool = OllamaPool()
@@ -0,0 +1,310 @@
+"""Turn follow-up messages into self-contained web search queries."""
+
+import os
+import re
+
+from cache import TTLCache
+
+# Conversations whose current topic and rewritten queries are remembered, and for how long
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))
+
+# Most words taken from an earlier message to stand in for a reference
+TOPIC_MAX_WORDS = int(os.getenv("TOPIC_MAX_WORDS", 5))
+
+# Rewritten queries remembered per conversation
+_MAX_QUERIES = 32
+
+# How many earlier messages are searched for a topic
+_LOOKBACK = 6
+
+# Words, keeping the "++" and "#" of names like C++ and F#
+_TOKEN = re.compile(r"[\w'’-]+[+#]*")
+
+# Words that can only be understood from an earlier message
+_PERSONAL = frozenset("he him she her they them".split())
+_POSSESSIVE = frozenset("his her their its".split())
+# Words that often refer back, but are just as often part of a complete question
+_WEAK = frozenset("it this that these those there".split())
+# Follow-ups that continue the last question with something new
+_ELLIPSIS = re.compile(r"^(and|also|what about|how about|what of|same for|and what about)\b\s*", re.I)
+_ONE = re.compile(r"\b(that|this|which|the (first|second|third|last|other|same)) ones?\b", re.I)
+
+# Sentence punctuation around a word, ignored when comparing words
+_EDGE_PUNCTUATION = '.,!?;:"()[]{}“”‘’'
+
+
+_STOPWORDS = frozenset(
+    "a an and are as at be been being but by can could did do does for from had has have how i "
+    "if in into is it's me my of on or so than the then to too was we were what what's when "
+    "where which who who's whom why will with would you your about just really tell please "
+    "know show find search look up give want like get let's lets also ok okay well".split()
+)
+
+
+def normalize(text):
+    """
+    Lowercase, with punctuation removed and whitespace collapsed.
+
+    Only for comparing messages (memo keys, topics); queries keep their
+    punctuation, since "C++", "5%" and "$100" mean something to a search.
+    """
+    return ' '.join(re.sub(r"[^\w\s'-]", ' ', text.lower().replace('’', "'")).split())
+
+
+def _words(text):
+    return _TOKEN.findall(text.replace('’', "'"))
+
+
+def _strip_possessive(word):
+    return word[:-2] if word.lower().endswith("'s") else word
+
+
+def _is_name(word):
+    lower = word.lower()
+    # "Paris", "iPhone", "NASA"; not "I" or "I'm"
+    return (word != lower and word != 'I' and not word.startswith("I'")
+            and lower not in _STOPWORDS and lower not in _PERSONAL | _POSSESSIVE | _WEAK)
+
+
+def subject(text):
+    """
+    The terms a message is about, or [] if it has none of its own.
+
+    Capitalized names ("Ed Sheeran", "Mount Fuji") are preferred; otherwise
+    the content words are used. At most TOPIC_MAX_WORDS terms are kept.
+    """
+    words = [_strip_possessive(w) for w in _words(text)]
+    # The first word of a sentence is capitalized anyway, so it only counts
+    # as a name if it is more than capitalized ("NASA", "C++", "iPhone")
+    names = [
+        w.lower() for i, w in enumerate(words)
+        if _is_name(w) and (i or not w.isalpha() or w[1:] != w[1:].lower())
+    ]
+    terms = names or [
+        w.lower() for w in words
+        if w.lower() not in _STOPWORDS and w.lower() not in _PERSONAL | _POSSESSIVE | _WEAK
+    ]
+    return _dedupe(terms)[:TOPIC_MAX_WORDS]
+
+
+def _dedupe(words):
+    seen = set()
+    unique = []
+    for word in words:
+        if word not in seen:
+            seen.add(word)
+            unique.append(word)
+    return unique
+
+
+def is_follow_up(text):
+    """
+    Whether a message needs an earlier one to make sense as a search.
+
+    True for messages with "he", "his", "them" or "that one", and for
+    continuations like "what about tomorrow" or one-word questions, unless
+    they name their own subject.
+    """
+    q = normalize(text)
+    words = set(q.split())
+    if words & _PERSONAL or words & (_POSSESSIVE - {'its'}) or _ONE.search(q):
+        return True
+    if any(_is_name(w) for w in _words(text)[1:]):
+        return False
+    content = [w for w in q.split() if w not in _STOPWORDS and w not in _WEAK]
+    return bool(words & _WEAK or words & {'its'} or _ELLIPSIS.match(q) or len(content) <= 1)
+
+
+def _term(word):
+    """A word as compared for duplicates: lowercase, without sentence punctuation or "'s"."""
+    return _strip_possessive(word.lower().replace('’', "'").strip(_EDGE_PUNCTUATION))
+
+
+def dedupe_terms(words):
+    """
+    Drop repeated terms from a query.
+
+    A word repeated back to back is dropped ("the the", "Sheeran
+    Sheeran's"), and so is a repeated two-word phrase ("ed sheeran songs
+    by ed sheeran" becomes "ed sheeran songs by"). Words that repeat in a
+    different phrase stay: "new york new year" is unchanged.
+    """
+    kept = []
+    terms = []
+    pairs = set()
+    i = 0
+    while i < len(words):
+        term = _term(words[i])
+        following = _term(words[i + 1]) if i + 1 < len(words) else None
+        if terms and term == terms[-1]:
+            i += 1
+            continue
+        if term not in _STOPWORDS and (term, following) in pairs:
+            i += 2
+            continue
+        if terms:
+            pairs.add((terms[-1], term))
+        kept.append(words[i])
+        terms.append(term)
+        i += 1
+    return kept
+
+
+def resolve(text, topic):
+    """
+    Rewrite a follow-up with its references replaced by ``topic``.
+
+    "is he a good singer?" about ["ed", "sheeran"] becomes
+    "is ed sheeran a good singer?"; "what about tomorrow" about
+    ["oslo", "weather"] becomes "oslo weather tomorrow".
+    The rest of the message is kept as written.
+    """
+    terms = {_term(w) for w in text.split()}
+    topic_words = [w for w in topic if w not in terms]
+    if not topic_words:
+        return ' '.join(dedupe_terms(text.split()))
+    phrase = ' '.join(topic_words)
+
+    text, replaced = _ONE.subn(phrase, text, count=1)
+    strong = _PERSONAL | _POSSESSIVE
+    # "it" or "that" only stand for the topic when there is no "he" or "his"
+    targets = strong if strong & {_term(w) for w in text.split()} else _WEAK
+    words = []
+    for word in text.split():
+        term = word.lower().strip(_EDGE_PUNCTUATION)
+        if not replaced and term in targets:
+            # Keep punctuation after the reference: "is he?" -> "is ed sheeran?"
+            words.append(phrase + word[len(word.rstrip(_EDGE_PUNCTUATION)):])
+            replaced = True
+        elif replaced and term in strong:
+            continue
+        else:
+            words.append(word)
+    if not replaced:
+        rest = _ELLIPSIS.sub('', ' '.join(words))
+        words = [phrase] + rest.split()
+    return ' '.join(dedupe_terms(' '.join(words).split()))
+
+
+class QueryRewriter:
+    """
+    Search queries that stand on their own, with a memo per conversation.
+
+    A message that names its subject is searched as written, without
+    repeated terms, and becomes the conversation's topic. Follow-ups ("is
+    he a good singer", "what about that one") have their references
+    replaced with the topic, which stays the same until a message names a
+    new one, so repeated follow-ups produce the same query and hit the
+    search cache.
+    The topic of a conversation this server hasn't seen yet is taken from
+    its most recent user message that names one. Later, user messages added
+    to the history since the last call are checked too, so a new subject
+    raised in a turn that wasn't searched still replaces the topic.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        """
+        Args:
+            maxsize: Conversations remembered
+            ttl: Seconds an unused conversation is remembered
+        """
+        self._conversations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.rewrites = 0
+        self.memo_hits = 0
+        self.unresolved = 0
+
+    @staticmethod
+    def _topic_from_history(history):
+        recent_user = [
+            msg.get('content', '') for msg in (history[-_LOOKBACK:] if history else [])
+            if msg.get('role') == 'user' and msg.get('content', '')
+        ]
+        for content in reversed(recent_user):
+            if not is_follow_up(content):
+                topic = subject(content)
+                if topic:
+                    return topic
+        return []
+
+    @staticmethod
+    def _marker(messages):
+        return [(msg.get('role'), msg.get('content', '')) for msg in messages]
+
+    @classmethod
+    def _unseen(cls, history, last):
+        """The messages after ``last``, or None if they are no longer in the history."""
+        marked = cls._marker(history)
+        for end in range(len(marked), len(last) - 1, -1):
+            if marked[end - len(last):end] == last:
+                return history[end:]
+        return None
+
+    def _update_topic(self, entry, history):
+        # History is capped to its most recent messages, so its length stops
+        # growing; the last turn seen marks where the new messages start
+        new = self._unseen(history, entry['last']) if entry['last'] else None
+        topic = self._topic_from_history(history if new is None else new)
+        if topic and topic != entry['topic']:
+            entry['topic'] = topic
+            entry['queries'].clear()
+        if history:
+            entry['last'] = self._marker(history[-2:])
+
+    def rewrite(self, user_input, history=None, conversation_id=None):
+        """
+        Build the search query for a message.
+
+        Args:
+            user_input: The user's message
+            history: Conversation history before the message
+            conversation_id: Conversation whose topic and memo are used (optional)
+
+        Returns:
+            Search query string
+        """
+        entry = self._conversations.get(conversation_id) if conversation_id else None
+        if entry is None:
+            entry = {'topic': [], 'queries': {}, 'last': None}
+            if conversation_id:
+                self._conversations.set(conversation_id, entry)
+        self._update_topic(entry, history or [])
+
+        if not is_follow_up(user_input):
+            topic = subject(user_input)
+            if topic and topic != entry['topic']:
+                entry['topic'] = topic
+                entry['queries'].clear()
+            return ' '.join(dedupe_terms(user_input.split()))
+
+        key = normalize(user_input)
+        query = entry['queries'].get(key)
+        if query is not None:
+            self.memo_hits += 1
+            return query
+        if not entry['topic']:
+            self.unresolved += 1
+            return ' '.join(dedupe_terms(user_input.split()))
+
+        query = resolve(user_input, entry['topic'])
+        self.rewrites += 1
+        if len(entry['queries']) >= _MAX_QUERIES:
+            entry['queries'].pop(next(iter(entry['queries'])))
+        entry['queries'][key] = query
+        return query
+
+    def forget(self, conversation_id=None):
+        """Drop one conversation, or every conversation if none is given."""
+        if conversation_id is None:
+            self._conversations.clear()
+        else:
+            self._conversations.delete(conversation_id)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            'conversations': len(self._conversations),
+            'rewrites': self.rewrites,
+            'memo_hits': self.memo_hits,
+            'unresolved': self.unresolved,
+        }
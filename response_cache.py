@@ -0,0 +1,166 @@
+"""Cache of complete answers to standalone questions, replayed as a stream."""
+
+import asyncio
+import math
+import os
+import re
+
+from cache import TTLCache
+from intent import classify
+from ollama_pool import pool
+
+# Off by default: a cached answer is reused verbatim instead of regenerated
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_FILE = os.getenv("RESPONSE_CACHE_FILE") or None
+
+# With an embedding model set (e.g. "nomic-embed-text"), a question whose
+# embedding is at least this similar to a cached one reuses its answer
+RESPONSE_CACHE_EMBED_MODEL = os.getenv("RESPONSE_CACHE_EMBED_MODEL", "")
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95))
+
+# Longer messages are rarely repeated word for word, so they are not cached
+RESPONSE_CACHE_MAX_QUERY = 500
+
+
+def normalize_query(query):
+    """Lowercase and drop punctuation and extra spaces."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+class ResponseCache:
+    """
+    Answers keyed on model + normalized question, with optional similarity matching.
+
+    Only first messages of a conversation are cached (anything with history
+    depends on that history), and never questions about the current time or
+    date. Entries live in a TTLCache, so expiry, size limit and persistence
+    also apply to the embeddings stored with them; the similarity search is
+    a linear scan over the cached embeddings of the same model.
+    """
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE, maxsize: int = RESPONSE_CACHE_SIZE,
+                 ttl: float = RESPONSE_CACHE_TTL, path: str | None = RESPONSE_CACHE_FILE,
+                 embed_model: str = RESPONSE_CACHE_EMBED_MODEL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY):
+        """
+        Args:
+            enabled: Whether answers are cached and served
+            maxsize: Maximum number of cached answers
+            ttl: Seconds an answer is served for
+            path: Optional JSON file for persistence across restarts
+            embed_model: Ollama embedding model for similarity matching ("" to disable)
+            similarity: Minimum cosine similarity for a similarity match
+        """
+        self.enabled = enabled
+        self.embed_model = embed_model
+        self.similarity = similarity
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl, path=path if enabled else None)
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+
+    def cacheable(self, query, history=None, summary=""):
+        """Whether a message may be answered from (and stored in) the cache."""
+        if not self.enabled or history or summary:
+            return False
+        return 0 < len(query) <= RESPONSE_CACHE_MAX_QUERY and not classify(query).mentions_time
+
+    async def _embed(self, text):
+        try:
+            response = await pool.acall('embed', model=self.embed_model, input=text)
+            return _unit(list(response['embeddings'][0]))
+        except Exception as e:
+            print(f"Error embedding query for the response cache: {e}")
+            return None
+
+    async def lookup(self, model, query, history=None, summary=""):
+        """
+        Find a cached answer.
+
+        Returns:
+            Tuple of (answer or None, key); pass the key to ``record`` on a
+            miss, or None if the message must not be cached
+        """
+        if not self.enabled:
+            return None, None
+        if not self.cacheable(query, history, summary):
+            self.bypassed += 1
+            return None, None
+
+        key = {"model": model, "query": normalize_query(query), "vector": None}
+        entry = self._entries.get(f"{model}:{key['query']}")
+        if entry is not None:
+            self.exact_hits += 1
+            return entry['text'], None
+
+        if self.embed_model:
+            key['vector'] = await self._embed(key['query'])
+        if key['vector'] is not None:
+            best = await asyncio.to_thread(self._nearest, model, key['vector'])
+            if best is not None:
+                self.similar_hits += 1
+                return best['text'], None
+
+        self.misses += 1
+        return None, key
+
+    def _nearest(self, model, vector):
+        """Most similar cached entry of ``model`` above the threshold, or None."""
+        best, best_score = None, self.similarity
+        for _, candidate in self._entries.items():
+            if candidate['model'] == model and candidate['vector']:
+                score = sum(a * b for a, b in zip(vector, candidate['vector']))
+                if score >= best_score:
+                    best, best_score = candidate, score
+        return best
+
+    async def record(self, key, chunks):
+        """
+        Pass a response stream through, caching the answer if it completes.
+
+        Args:
+            key: Key from ``lookup`` (None to pass through without caching)
+            chunks: Async iterator of response text
+        """
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        text = "".join(parts)
+        if key is not None and text.strip():
+            self._entries.set(f"{key['model']}:{key['query']}", {**key, 'text': text})
+            self.stores += 1
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'exact_hits': self.exact_hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_rate': round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+        }
+
+    def save(self) -> None:
+        """Persist entries if a file is configured."""
+        self._entries.save()
+
+
+async def replay(text, words_per_chunk=4):
+    """Stream a cached answer back a few words at a time."""
+    pieces = re.findall(r'\S+\s*|\s+', text)
+    for i in range(0, len(pieces), words_per_chunk):
+        yield "".join(pieces[i:i + words_per_chunk])
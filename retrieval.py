@@ -0,0 +1,290 @@
+"""Fetch the pages behind search results and pick the passages that answer the query."""
+
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter
+from html.parser import HTMLParser
+
+import httpx
+
+from cache import TTLCache
+from context import estimate_tokens
+
+# Off by default: reading pages adds up to RETRIEVAL_TIMEOUT before the answer starts
+RETRIEVAL = os.getenv("RETRIEVAL", "false").lower() == "true"
+
+# How many of the top results are read, and how long that may take in total
+RETRIEVAL_PAGES = int(os.getenv("RETRIEVAL_PAGES", 3))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", 4))
+
+# Passages are about this many words; the best ones are sent up to the token budget
+RETRIEVAL_CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", 120))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 1200))
+
+# Larger pages are cut off here
+RETRIEVAL_MAX_BYTES = int(os.getenv("RETRIEVAL_MAX_BYTES", 2_000_000))
+
+# Extracted text is reused without asking the site for RETRIEVAL_FRESH seconds,
+# then revalidated with its ETag / Last-Modified until RETRIEVAL_CACHE_TTL
+page_cache = TTLCache(
+    maxsize=int(os.getenv("RETRIEVAL_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", 86400)),
+)
+RETRIEVAL_FRESH = float(os.getenv("RETRIEVAL_FRESH", 600))
+
+_HTTP_OPTIONS = dict(
+    headers={"User-Agent": "Mozilla/5.0", "Accept": "text/html,text/plain;q=0.9"},
+    timeout=RETRIEVAL_TIMEOUT, follow_redirects=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
+_http = None
+
+# Tags whose text is never content
+_SKIP_TAGS = {
+    'title', 'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'form', 'button',
+    'select', 'nav', 'header', 'footer', 'aside', 'menu', 'dialog',
+}
+# Tags that end a paragraph
+_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'table', 'tr', 'td', 'th',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'br', 'dd', 'dt', 'figcaption',
+}
+_VOID_TAGS = {'br', 'img', 'hr', 'input', 'meta', 'link', 'source', 'wbr', 'area', 'col', 'embed'}
+
+# Lines shorter than this are menus, buttons and bylines rather than prose
+_MIN_LINE_CHARS = 40
+
+_WORD = re.compile(r'\w+')
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this "
+    "to was were what when where which who why will with you your".split()
+)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text as paragraphs, separately for <main>/<article>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.paragraphs = []
+        self.main_paragraphs = []
+        self._current = []
+
+    def _end_paragraph(self):
+        text = ' '.join(' '.join(self._current).split())
+        self._current = []
+        if text:
+            self.paragraphs.append(text)
+            if self.main_depth:
+                self.main_paragraphs.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            if tag == 'br':
+                self._end_paragraph()
+            return
+        if tag in _SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in ('main', 'article'):
+            self._end_paragraph()
+            self.main_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in ('main', 'article'):
+            self._end_paragraph()
+            self.main_depth = max(self.main_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self._current.append(data)
+
+
+def extract_text(html):
+    """
+    Main text of an HTML page, one paragraph per line.
+
+    Drops scripts, navigation, headers, footers and forms. If the page marks
+    its content with <main> or <article>, only that is kept. Short lines
+    (menus, buttons, bylines) are dropped too.
+    """
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    parser._end_paragraph()
+    paragraphs = parser.paragraphs
+    main_text = sum(len(p) for p in parser.main_paragraphs)
+    if main_text >= 500:
+        paragraphs = parser.main_paragraphs
+    return '\n'.join(p for p in paragraphs if len(p) >= _MIN_LINE_CHARS)
+
+
+def chunk_text(text, words_per_chunk=RETRIEVAL_CHUNK_WORDS):
+    """Split text into passages of about ``words_per_chunk`` words, without splitting paragraphs that fit."""
+    chunks = []
+    current = []
+    for paragraph in text.split('\n'):
+        words = paragraph.split()
+        if current and len(current) + len(words) > words_per_chunk:
+            chunks.append(' '.join(current))
+            current = []
+        while len(words) > words_per_chunk:
+            chunks.append(' '.join(words[:words_per_chunk]))
+            words = words[words_per_chunk:]
+        current.extend(words)
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _terms(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def bm25_scores(query, passages, k1=1.5, b=0.75):
+    """Okapi BM25 score of each passage for the query."""
+    query_terms = set(_terms(query))
+    if not query_terms or not passages:
+        return [0.0] * len(passages)
+    docs = [Counter(_terms(p)) for p in passages]
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1
+    df = {t: sum(1 for d in docs if t in d) for t in query_terms}
+    idf = {t: math.log(1 + (len(docs) - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term, 0)
+            if tf:
+                score += idf[term] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def _client():
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(**_HTTP_OPTIONS)
+    return _http
+
+
+async def fetch_page_text(url):
+    """
+    Extracted text of a page, or "" if it can't be read.
+
+    Cached by URL; a cached page older than RETRIEVAL_FRESH is revalidated
+    with its ETag (or Last-Modified) and only downloaded again if it changed.
+    """
+    cached = page_cache.get(url)
+    if cached and time.time() - cached['fetched_at'] < RETRIEVAL_FRESH:
+        return cached['text']
+
+    headers = {}
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        async with _client().stream('GET', url, headers=headers) as resp:
+            if resp.status_code == 304 and cached:
+                page_cache.set(url, {**cached, 'fetched_at': time.time()})
+                return cached['text']
+            if resp.status_code != 200:
+                return ""
+            content_type = resp.headers.get('content-type', '')
+            if 'html' not in content_type and 'text/plain' not in content_type:
+                return ""
+            body = bytearray()
+            async for data in resp.aiter_bytes():
+                body.extend(data)
+                if len(body) >= RETRIEVAL_MAX_BYTES:
+                    break
+            raw = body.decode(resp.encoding or 'utf-8', errors='replace')
+            etag = resp.headers.get('etag')
+            last_modified = resp.headers.get('last-modified')
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return ""
+
+    # Parsing a large page takes a few milliseconds; keep it off the event loop
+    text = raw if 'html' not in content_type else await asyncio.to_thread(extract_text, raw)
+    page_cache.set(url, {
+        'text': text, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time(),
+    })
+    return text
+
+
+async def _fetch_with_deadline(url, timeout):
+    try:
+        return await asyncio.wait_for(fetch_page_text(url), timeout)
+    except asyncio.TimeoutError:
+        return ""
+
+
+async def retrieve(query, results, pages=RETRIEVAL_PAGES, token_budget=RETRIEVAL_TOKEN_BUDGET,
+                   model="", timeout=RETRIEVAL_TIMEOUT):
+    """
+    Read the top search results and pick the passages most relevant to the query.
+
+    Args:
+        query: Search query the passages are ranked against
+        results: Sources as built for the frontend (``number``, ``title``, ``url``)
+        pages: How many of the top results are read
+        token_budget: Most tokens of passages returned
+        model: Model whose tokenizer the budget is estimated for
+        timeout: Seconds to wait for the pages; slower ones are left out
+
+    Returns:
+        List of dicts with ``number``, ``title``, ``url`` and ``text``, best first
+    """
+    sources = [r for r in results if r.get('url', '').startswith(('http://', 'https://'))][:pages]
+    texts = await asyncio.gather(*(_fetch_with_deadline(s['url'], timeout) for s in sources))
+
+    passages = []
+    for source, text in zip(sources, texts):
+        passages.extend((source, chunk) for chunk in chunk_text(text))
+    if not passages:
+        return []
+
+    scores = bm25_scores(query, [chunk for _, chunk in passages])
+    ranked = sorted(zip(scores, range(len(passages))), reverse=True)
+
+    selected = []
+    used = 0
+    for score, index in ranked:
+        if score <= 0:
+            break
+        source, chunk = passages[index]
+        tokens = estimate_tokens(chunk, model)
+        if used + tokens > token_budget:
+            continue
+        used += tokens
+        selected.append({
+            'number': source['number'], 'title': source['title'], 'url': source['url'], 'text': chunk,
+        })
+    return selected
+
+
+def format_passages(passages):
+    """Passages as a prompt section, each labelled with its source number."""
+    if not passages:
+        return ""
+    text = "## Page Excerpts\nPassages from the result pages most relevant to the question:\n\n"
+    for passage in passages:
+        text += f"[{passage['number']}] {passage['text']}\n\n"
+    return text
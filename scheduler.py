@@ -0,0 +1,207 @@
+"""Admission control: per-model generation limits with a bounded priority queue."""
+
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from ollama_pool import pool
+
+# Generations run at once per model and per Ollama server; match Ollama's
+# OLLAMA_NUM_PARALLEL. Per-model overrides (totals) e.g. "llama3.2=8,mistral=2"
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", 4))
+MODEL_CONCURRENCY_OVERRIDES = {
+    name.strip(): int(size)
+    for name, _, size in (
+        item.partition('=') for item in os.getenv("MODEL_CONCURRENCY_OVERRIDES", "").split(',')
+    )
+    if name.strip() and size.strip().isdigit()
+}
+
+# Requests allowed to wait per model; beyond that new ones get a 429
+QUEUE_MAX = int(os.getenv("QUEUE_MAX", 256))
+
+# Lower runs first; requests with the same priority run in arrival order
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+
+
+class QueueFullError(Exception):
+    """Raised when a model's queue is full."""
+
+    def __init__(self, model, retry_after):
+        super().__init__(f"Too many requests for model '{model}'. Please retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A request's place in a model's queue, and then its generation slot."""
+
+    def __init__(self, lane, priority, order):
+        self.lane = lane
+        self.key = (priority, order)
+        self.granted = False
+        self.released = False
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self._changed = asyncio.Event()
+
+    def position(self):
+        """1-based place in the queue, or 0 once the slot is granted."""
+        if self.granted:
+            return 0
+        return bisect.bisect_left(self.lane.waiting, (self.key,)) + 1
+
+    async def positions(self):
+        """
+        Wait for the slot, yielding the queue position whenever it changes.
+
+        Yields nothing if the slot was granted right away.
+        """
+        last = None
+        while not self.granted:
+            position = self.position()
+            if position != last:
+                last = position
+                yield position
+            self._changed.clear()
+            if not self.granted:
+                await self._changed.wait()
+
+    async def wait(self):
+        """Wait for the slot."""
+        async for _ in self.positions():
+            pass
+
+    def release(self):
+        """Give up the slot, or the place in the queue. Safe to call twice."""
+        if not self.released:
+            self.released = True
+            self.lane.release(self)
+
+
+class Lane:
+    """Slots and queue for one model."""
+
+    def __init__(self, model, limit, max_queue):
+        self.model = model
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = []
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_wait = 0.0
+        self.avg_duration = 0.0
+        self._order = itertools.count()
+
+    def admit(self, priority):
+        if self.active >= self.limit and len(self.waiting) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.model, self.retry_after())
+        ticket = Ticket(self, priority, next(self._order))
+        self.admitted += 1
+        bisect.insort(self.waiting, (ticket.key, ticket))
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket):
+        if ticket.granted:
+            self.active -= 1
+            duration = time.monotonic() - ticket.started_at
+            self.avg_duration += (duration - self.avg_duration) * 0.1
+        else:
+            self.waiting.remove((ticket.key, ticket))
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.waiting and self.active < self.limit:
+            _, ticket = self.waiting.pop(0)
+            ticket.granted = True
+            ticket.started_at = time.monotonic()
+            self.avg_wait += (ticket.started_at - ticket.queued_at - self.avg_wait) * 0.1
+            self.active += 1
+            ticket._changed.set()
+        # Everyone still waiting moved up a place
+        for _, ticket in self.waiting:
+            ticket._changed.set()
+
+    def retry_after(self):
+        """Seconds until the queue has likely drained enough to take a request."""
+        per_slot = self.avg_duration or 10.0
+        return max(1, math.ceil(per_slot * len(self.waiting) / self.limit))
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'queued': len(self.waiting),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'avg_wait': round(self.avg_wait, 3),
+            'avg_duration': round(self.avg_duration, 3),
+        }
+
+
+class Scheduler:
+    """
+    Limits concurrent generations per model; the rest wait in a priority queue.
+
+    ``admit`` is synchronous so a full queue can be turned into an HTTP 429
+    before a streaming response starts. Everything runs on the event loop,
+    so no locking is needed.
+    """
+
+    def __init__(self, limit=None, max_queue=QUEUE_MAX, limits=None):
+        """
+        Args:
+            limit: Concurrent generations per model (defaults to
+                MODEL_CONCURRENCY per server in the pool)
+            max_queue: Waiting requests allowed per model
+            limits: Per-model overrides of ``limit``
+        """
+        self.limit = limit or MODEL_CONCURRENCY * len(pool.backends)
+        self.max_queue = max_queue
+        self.limits = MODEL_CONCURRENCY_OVERRIDES if limits is None else limits
+        self._lanes = {}
+
+    def _lane(self, model):
+        lane = self._lanes.get(model)
+        if lane is None:
+            limit = self.limits.get(model, self.limits.get(model.split(':')[0], self.limit))
+            lane = self._lanes[model] = Lane(model, max(limit, 1), self.max_queue)
+        return lane
+
+    def admit(self, model, priority=PRIORITY_INTERACTIVE):
+        """
+        Queue a request for a generation slot.
+
+        Returns:
+            Ticket; wait on it before generating and release it afterwards
+
+        Raises:
+            QueueFullError: If the model's queue is full
+        """
+        return self._lane(model).admit(priority)
+
+    @asynccontextmanager
+    async def slot(self, model, priority=PRIORITY_INTERACTIVE):
+        """Hold a generation slot for the duration of a ``with`` block."""
+        ticket = self.admit(model, priority)
+        try:
+            await ticket.wait()
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> dict:
+        """Per-model counters for monitoring."""
+        return {model: lane.stats() for model, lane in self._lanes.items()}
+
+
+# Shared by every request handler
+scheduler = Scheduler()
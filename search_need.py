@@ -0,0 +1,202 @@
+"""Decide whether a message in search mode actually needs a web search."""
+
+import json
+import math
+import os
+import re
+from dataclasses import dataclass
+
+from intent import classify
+
+# Off: every message in search mode is searched, as before
+SEARCH_CLASSIFIER = os.getenv("SEARCH_CLASSIFIER", "true").lower() == "true"
+
+# Model weights written by benchmarks/search_need_eval.py --train
+SEARCH_MODEL_FILE = os.getenv(
+    "SEARCH_MODEL_FILE", os.path.join(os.path.dirname(__file__), 'search_need_model.json')
+)
+
+# Minimum model probability for a search; lower means fewer missed searches
+SEARCH_THRESHOLD = float(os.getenv("SEARCH_THRESHOLD", 0.3))
+
+_WORD = re.compile(r"[\w']+")
+
+# Messages made only of these words are small talk
+SMALLTALK = frozenset(
+    "thanks thank you thx ty ok okay k cool nice great awesome perfect good got it hi hello hey "
+    "bye goodbye see later lol haha hmm yes yeah yep no nope sure please morning night evening "
+    "that's thats all makes sense the best you're youre so much".split()
+)
+
+# Answers that depend on the current state of the world
+_FRESH = re.compile(
+    r"\b(latest|news|today|tonight|tomorrow|yesterday|this (week|month|year)|right now|currently|"
+    r"current|price|prices|stock|weather|forecast|score|scores|who won|release date|"
+    r"coming out|trending|release notes|changelog|20[2-3]\d)\b"
+)
+
+# Tasks the model does on its own, when the message starts with one:
+# writing, maths and translation. Topics ("python", "explain ...") are left
+# to the model, since questions about them often need current information.
+_OFFLINE = re.compile(
+    r"^(please |can you |could you |would you |help me )?"
+    r"(write|rewrite|draft|compose|proofread|paraphrase|translate|summari[sz]e|brainstorm|generate|"
+    r"calculate|compute|solve|simplify|factor|differentiate|integrate)\b"
+)
+
+# Plain arithmetic ("2.5 times 4", "15% of 240", "3 + 4")
+_ARITHMETIC = re.compile(
+    r"\d(\.\d+)?\s*(times|plus|minus|divided by|multiplied by|to the power of|[-+*/x^])\s*\d"
+    r"|\d%\s*of\s*\d"
+)
+
+# A name followed by a version ("python 3.13", "ubuntu 24.04", "node v22",
+# "version 5") points at a specific release; "is 2.5" or "times 1.5" is maths
+_VERSION = re.compile(
+    r"\b(?!(?:is|of|times|multiply|divide|plus|minus|by|and|to|than|x|about|at|or|over|from)\b)"
+    r"[a-z][\w+#-]* v?\d+(\.\d+)+\b|\bv\d+\b|\bversion \d+"
+)
+
+PRONOUNS = frozenset("he him his she her they them their it its there that those this one".split())
+
+
+@dataclass(frozen=True)
+class SearchNeed:
+    """Which lookups a message needs, and why."""
+    search: bool
+    images: bool
+    reason: str
+
+
+def features(query, has_history=False):
+    """Sparse binary features of a message for the search model."""
+    q = query.lower().strip()
+    words = _WORD.findall(q)
+    feats = {"bias"}
+    feats.update(f"w:{w}" for w in words)
+    feats.update(f"cat:{c}" for c in classify(query).categories)
+    feats.add(f"len:{min(len(words), 12) // 3}")
+    if words:
+        feats.add(f"first:{words[0]}")
+    if has_history:
+        feats.add("history")
+        if PRONOUNS & set(words):
+            feats.add("history+pronoun")
+    if any(ch.isdigit() for ch in q):
+        feats.add("digit")
+    if q.endswith('?'):
+        feats.add("question")
+    if _FRESH.search(q):
+        feats.add("fresh")
+    if _VERSION.search(q):
+        feats.add("version")
+    if _OFFLINE.search(q) or _ARITHMETIC.search(q):
+        feats.add("offline")
+    return feats
+
+
+def load_model(path=SEARCH_MODEL_FILE):
+    """Feature weights, or None if no model has been trained."""
+    try:
+        with open(path) as f:
+            return json.load(f)['weights']
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading search model {path}: {e}")
+        return None
+
+
+class SearchNeedClassifier:
+    """
+    Rules first, then a small logistic regression for everything else.
+
+    The rules settle the clear cases: small talk, explicit search requests,
+    questions about current events or a specific version, arithmetic, and
+    messages that start by asking for writing, maths or a translation. The rest
+    is scored by a linear model over word and intent features. Without a
+    model file, undecided messages are searched. Images follow the same
+    keyword rule as before (``QueryIntent.wants_images``), but only for
+    messages that are searched.
+    """
+
+    def __init__(self, enabled: bool = SEARCH_CLASSIFIER, weights: dict | None = None,
+                 threshold: float = SEARCH_THRESHOLD):
+        """
+        Args:
+            enabled: Whether searches may be skipped at all
+            weights: Feature weights (defaults to the trained model file)
+            threshold: Minimum probability for the model to ask for a search
+        """
+        self.enabled = enabled
+        self.weights = load_model() if weights is None else weights
+        self.threshold = threshold
+        self.decisions = {}
+        self.images_skipped = 0
+        self.avg_search_seconds = 0.0
+        self.searches_timed = 0
+
+    def probability(self, query, has_history=False):
+        """Model probability that the message needs a search (None without a model)."""
+        if not self.weights:
+            return None
+        score = sum(self.weights.get(f, 0.0) for f in features(query, has_history))
+        return 1 / (1 + math.exp(-max(min(score, 30), -30)))
+
+    def _decide_search(self, query, has_history):
+        q = query.lower().strip()
+        words = _WORD.findall(q)
+        if not words or set(words) <= SMALLTALK:
+            return False, "smalltalk"
+        if 'search' in classify(query).categories:
+            return True, "explicit"
+        if _FRESH.search(q):
+            return True, "fresh"
+        if _VERSION.search(q):
+            return True, "version"
+        if _OFFLINE.search(q) or _ARITHMETIC.search(q):
+            return False, "offline_task"
+        p = self.probability(query, has_history)
+        if p is None:
+            return True, "default"
+        return p >= self.threshold, "model"
+
+    def decide(self, query, history=None):
+        """
+        Decide which lookups a message needs.
+
+        Args:
+            query: The user's message
+            history: Conversation history (only whether there is any matters)
+
+        Returns:
+            SearchNeed
+        """
+        wants_images = classify(query).wants_images
+        if not self.enabled:
+            return SearchNeed(search=True, images=wants_images, reason="disabled")
+        search, reason = self._decide_search(query, bool(history))
+        need = SearchNeed(search=search, images=search and wants_images, reason=reason)
+        key = f"{'search' if search else 'skip'}:{reason}"
+        self.decisions[key] = self.decisions.get(key, 0) + 1
+        if wants_images and not need.images:
+            self.images_skipped += 1
+        return need
+
+    def record_search(self, seconds):
+        """Record how long a web search took, for the time-saved estimate."""
+        self.searches_timed += 1
+        self.avg_search_seconds += (seconds - self.avg_search_seconds) / min(self.searches_timed, 50)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        skipped = sum(n for key, n in self.decisions.items() if key.startswith('skip:'))
+        return {
+            'enabled': self.enabled,
+            'model_loaded': bool(self.weights),
+            'decisions': dict(self.decisions),
+            'skipped': skipped,
+            'images_skipped': self.images_skipped,
+            'avg_search_seconds': round(self.avg_search_seconds, 3),
+            'estimated_seconds_saved': round(skipped * self.avg_search_seconds, 1),
+        }
@@ -0,0 +1,89 @@
+"""Background lookups started on a guess, kept only if the response confirms them."""
+
+import re
+
+# How speculative lookups ended, for monitoring
+_counts = {'started': 0, 'used': 0, 'refetched': 0, 'discarded': 0}
+
+_WORD = re.compile(r"[\w']+")
+
+# Words that say nothing about which video or page is meant
+_FILLER = frozenset(
+    "a an and any are be can could do does for from good great have i in is it me my of on or "
+    "please recommend some something suggest that the this to what what's which with you your "
+    "video videos song songs music official play watch listen youtube".split()
+)
+
+
+def content_words(text):
+    """Lowercased words of ``text`` that say what it is about, in order, without repeats."""
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word not in _FILLER and word not in words:
+            words.append(word)
+    return words
+
+
+def _overlaps(params, query):
+    """Whether most of the marker's content words are in the speculative query."""
+    wanted = set(content_words(params))
+    if not wanted:
+        return ' '.join(params.lower().split()) == ' '.join(query.lower().split())
+    return 2 * len(wanted & set(content_words(query))) >= len(wanted)
+
+
+class Speculation:
+    """
+    A lookup started before the model has said whether it is needed.
+
+    The lookup runs alongside generation. If the response contains a task
+    marker of ``task_type``, the speculation is confirmed: its result is
+    used if at least half of the marker's content words are in the
+    speculative query, otherwise the lookup is redone for the marker's
+    query. If the response ends without such a marker, the lookup is
+    cancelled.
+    """
+
+    def __init__(self, task_type, key, query, lookup):
+        """
+        Args:
+            task_type: Task marker type that confirms the speculation
+            key: Metadata key the result is sent under
+            query: Query the lookup is started with
+            lookup: Function of a query returning a task (or None to skip)
+        """
+        self.task_type = task_type
+        self.key = key
+        self.query = query
+        self.lookup = lookup
+        self.settled = False
+        self.task = lookup(query)
+        _counts['started'] += 1
+
+    def confirm(self, params):
+        """
+        Keep the lookup for a marker with these params.
+
+        Returns:
+            Task whose result should be sent, or None
+        """
+        self.settled = True
+        if _overlaps(params, self.query):
+            _counts['used'] += 1
+            return self.task
+        _counts['refetched'] += 1
+        self.task.cancel()
+        return self.lookup(params)
+
+    def discard(self):
+        """Cancel the lookup unless it was confirmed. Safe to call twice."""
+        if not self.settled:
+            self.settled = True
+            self.task.cancel()
+            _counts['discarded'] += 1
+
+
+def stats() -> dict:
+    """Counters for monitoring."""
+    return dict(_counts)
+
@@ -0,0 +1,608 @@
+"""SQLite-backed conversation store for ChatFreeGPT."""
+
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (conversation_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_id TEXT PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    covered INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_updated
+    ON conversations (updated_at DESC, id DESC);
+"""
+
+# Full-text index over message contents, kept in sync by triggers (including
+# the deletes cascaded from a conversation). Only created if SQLite has FTS5.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# Matched terms in search snippets are wrapped in these characters
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+SNIPPET_TOKENS = 12
+
+
+class ConflictError(Exception):
+    """Raised when a write's expected version does not match the stored one."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Conversation is at version {current_version}")
+        self.current_version = current_version
+
+
+def _encode_cursor(updated_at, conversation_id):
+    raw = json.dumps([updated_at, conversation_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    updated_at, conversation_id = json.loads(base64.urlsafe_b64decode(padded))
+    return updated_at, conversation_id
+
+
+def _snippet(text, words, width=80):
+    """Excerpt of ``text`` around the first match, with matches highlighted like FTS5's snippet()."""
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max((first.start() if first else 0) - width // 2, 0)
+    excerpt = text[start:start + width]
+    excerpt = pattern.sub(lambda m: HIGHLIGHT_START + m.group(0) + HIGHLIGHT_END, excerpt)
+    return ('…' if start > 0 else '') + excerpt + ('…' if start + width < len(text) else '')
+
+
+def _now():
+    """Current UTC time in the same ISO format the frontend uses."""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class ConversationStore:
+    """
+    Conversation storage where every conversation and message is its own row.
+
+    Writes touch only the rows that changed, so appending a message costs
+    the same regardless of how much history is stored. The database runs
+    in WAL mode, so readers never block the writer and a crash mid-write
+    can only lose the transaction in flight.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) the conversation database.
+
+        Args:
+            path: SQLite database file path
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self.fts = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        """Create the full-text index (filling it from existing messages); False without FTS5."""
+        conn = self._connect()
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone() is not None
+        try:
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+                if not existed:
+                    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, falling back to substring search: {e}")
+            return False
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # -- Reads -------------------------------------------------------------
+
+    def exists(self, conversation_id: str) -> bool:
+        """Check whether a conversation is stored."""
+        row = self._connect().execute(
+            "SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row is not None
+
+    def get_version(self, conversation_id: str) -> int | None:
+        """Get a conversation's version number, or None if missing."""
+        row = self._connect().execute(
+            "SELECT version FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row['version'] if row else None
+
+    def get_messages(self, conversation_id: str, last: int | None = None) -> list[dict]:
+        """
+        Get the messages of a conversation in order.
+
+        Args:
+            conversation_id: Conversation to read
+            last: If given, only return the last N messages
+
+        Returns:
+            List of {role, content} dicts
+        """
+        conn = self._connect()
+        if last is None:
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT role, content FROM ("
+                "  SELECT seq, role, content FROM messages WHERE conversation_id = ?"
+                "  ORDER BY seq DESC LIMIT ?"
+                ") ORDER BY seq",
+                (conversation_id, last)
+            ).fetchall()
+        return [{'role': row['role'], 'content': row['content']} for row in rows]
+
+    def get(self, conversation_id: str, offset: int = 0,
+            limit: int | None = None) -> dict | None:
+        """
+        Get a conversation with a range of its messages, or None if missing.
+
+        Args:
+            conversation_id: Conversation to read
+            offset: Index of the first message; negative counts from the end
+            limit: Maximum number of messages (all remaining if None)
+
+        Returns:
+            Conversation dict with ``messages``, ``message_count`` and ``offset``
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT * FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        if offset < 0:
+            offset = max(row['message_count'] + offset, 0)
+        rows = conn.execute(
+            "SELECT role, content FROM messages WHERE conversation_id = ? AND seq >= ? "
+            "ORDER BY seq LIMIT ?",
+            (conversation_id, offset, -1 if limit is None else limit)
+        ).fetchall()
+
+        convo = self._row_to_conversation(row)
+        convo['message_count'] = row['message_count']
+        convo['offset'] = offset
+        convo['messages'] = [{'role': r['role'], 'content': r['content']} for r in rows]
+        return convo
+
+    def list_summaries(self, limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """
+        List conversations without their messages, most recently updated first.
+
+        Pages are keyed on (updated_at, id) and served from an index, so a
+        page costs the same no matter how many messages are stored.
+
+        Args:
+            limit: Page size
+            cursor: ``next_cursor`` from the previous page
+
+        Returns:
+            Tuple of (summaries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = "SELECT * FROM conversations"
+        params = []
+        if cursor:
+            try:
+                params = list(_decode_cursor(cursor))
+            except Exception:
+                raise ValueError("Invalid cursor")
+            query += " WHERE (updated_at, id) < (?, ?)"
+        query += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connect().execute(query, params).fetchall()
+        summaries = [
+            dict(self._row_to_conversation(row), id=row['id'], message_count=row['message_count'])
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = _encode_cursor(last['updated_at'], last['id'])
+        return summaries, next_cursor
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple[list[dict], int | None]:
+        """
+        Find conversations whose messages contain every word of ``query``.
+
+        Each conversation appears once, with its best matching message.
+        With FTS5, results are ranked by BM25 and the last word also matches
+        as a prefix, so results update while typing; without it, a slower
+        substring search returns the most recently updated matches first.
+
+        Args:
+            query: Words to search for
+            limit: Page size
+            offset: Number of results to skip
+
+        Returns:
+            Tuple of (results, next_offset); next_offset is None on the last
+            page. Each result has ``id``, ``title``, ``updated_at``, ``seq``
+            and ``role`` of the matching message, ``matches`` (matching
+            messages in the conversation) and a ``snippet`` with matched
+            words between HIGHLIGHT_START and HIGHLIGHT_END
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return [], None
+        if self.fts:
+            rows = self._search_fts(words, limit + 1, offset)
+        else:
+            rows = self._search_like(words, limit + 1, offset)
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+    def _search_fts(self, words, limit, offset):
+        match = ' '.join(f'"{word}"' for word in words) + '*'
+        conn = self._connect()
+        # Rank first, then build snippets only for the page. The bare columns
+        # of a MIN() aggregate come from the best matching message.
+        hits = conn.execute(
+            "SELECT m.id AS message_id, m.conversation_id, m.seq, m.role, MIN(rank) AS score,"
+            "  COUNT(*) AS matches, c.title, c.updated_at "
+            "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            "JOIN conversations c ON c.id = m.conversation_id "
+            "WHERE messages_fts MATCH ? "
+            "GROUP BY m.conversation_id ORDER BY score, m.conversation_id LIMIT ? OFFSET ?",
+            (match, limit, offset)
+        ).fetchall()
+        if not hits:
+            return []
+
+        ids = [hit['message_id'] for hit in hits]
+        snippets = dict(conn.execute(
+            f"SELECT rowid, snippet(messages_fts, 0, ?, ?, '…', ?) FROM messages_fts "
+            f"WHERE messages_fts MATCH ? AND rowid IN ({','.join('?' * len(ids))})",
+            (HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, match, *ids)
+        ).fetchall())
+        return [
+            {
+                'id': hit['conversation_id'],
+                'title': hit['title'],
+                'updated_at': hit['updated_at'],
+                'seq': hit['seq'],
+                'role': hit['role'],
+                'matches': hit['matches'],
+                'snippet': snippets.get(hit['message_id'], ''),
+            }
+            for hit in hits
+        ]
+
+    def _search_like(self, words, limit, offset):
+        conditions = ' AND '.join("m.content LIKE ? ESCAPE '\\'" for _ in words)
+        # Words can't contain % or a backslash, but _ is a word character
+        patterns = ['%' + word.replace('_', '\\_') + '%' for word in words]
+        rows = self._connect().execute(
+            "SELECT m.conversation_id, MIN(m.seq) AS seq, COUNT(*) AS matches, c.title, c.updated_at "
+            f"FROM messages m JOIN conversations c ON c.id = m.conversation_id WHERE {conditions} "
+            "GROUP BY m.conversation_id ORDER BY c.updated_at DESC, c.id DESC LIMIT ? OFFSET ?",
+            (*patterns, limit, offset)
+        ).fetchall()
+        results = []
+        for row in rows:
+            message = self._connect().execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? AND seq = ?",
+                (row['conversation_id'], row['seq'])
+            ).fetchone()
+            results.append({
+                'id': row['conversation_id'],
+                'title': row['title'],
+                'updated_at': row['updated_at'],
+                'seq': row['seq'],
+                'role': message['role'],
+                'matches': row['matches'],
+                'snippet': _snippet(message['content'], words),
+            })
+        return results
+
+    def all(self) -> dict:
+        """Get every conversation keyed by id, in the legacy JSON layout."""
+        conn = self._connect()
+        conversations = {
+            row['id']: dict(self._row_to_conversation(row), messages=[])
+            for row in conn.execute("SELECT * FROM conversations")
+        }
+        for row in conn.execute(
+            "SELECT conversation_id, role, content FROM messages ORDER BY conversation_id, seq"
+        ):
+            conversations[row['conversation_id']]['messages'].append(
+                {'role': row['role'], 'content': row['content']}
+            )
+        return conversations
+
+    def get_summary(self, conversation_id: str) -> tuple[str, int] | None:
+        """
+        Get the rolling summary of a conversation's older messages.
+
+        Returns:
+            Tuple of (summary, covered) where ``covered`` is how many leading
+            messages the summary replaces, or None if there is no summary
+        """
+        row = self._connect().execute(
+            "SELECT summary, covered FROM conversation_summaries WHERE conversation_id = ?",
+            (conversation_id,)
+        ).fetchone()
+        return (row['summary'], row['covered']) if row else None
+
+    @staticmethod
+    def _row_to_conversation(row: sqlite3.Row) -> dict:
+        return {
+            'title': row['title'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'version': row['version'],
+        }
+
+    # -- Writes ------------------------------------------------------------
+
+    def append_messages(self, conversation_id: str, messages: list[dict],
+                        title: str | None = None, created_at: str | None = None,
+                        expected_version: int | None = None) -> int:
+        """
+        Append messages to a conversation, creating it if needed.
+
+        Args:
+            conversation_id: Conversation to append to
+            messages: List of {role, content} dicts
+            title: Title to use when the conversation is created
+            created_at: Creation timestamp to use when the conversation is created
+            expected_version: If given, the write only happens when the stored
+                version matches (0 means the conversation must not exist yet)
+
+        Returns:
+            The conversation's new version number
+
+        Raises:
+            ConflictError: If expected_version does not match
+        """
+        with self._connect() as conn:
+            self._check_version(conn, conversation_id, expected_version)
+            return self._append(conn, conversation_id, messages, title, created_at)
+
+    def set_title(self, conversation_id: str, title: str,
+                  expected_version: int | None = None) -> int | None:
+        """
+        Rename a conversation.
+
+        Returns:
+            The new version number, or None if the conversation is missing
+
+        Raises:
+            ConflictError: If expected_version does not match
+        """
+        with self._connect() as conn:
+            self._check_version(conn, conversation_id, expected_version)
+            row = conn.execute(
+                "UPDATE conversations SET title = ?, updated_at = ?, version = version + 1 "
+                "WHERE id = ? RETURNING version",
+                (title[:200], _now(), conversation_id)
+            ).fetchone()
+            return row['version'] if row else None
+
+    def set_summary(self, conversation_id: str, summary: str, covered: int,
+                    expected_version: int | None = None) -> None:
+        """
+        Store the rolling summary covering the first ``covered`` messages.
+
+        Raises:
+            ConflictError: If expected_version does not match (including a
+                conversation deleted since it was read)
+        """
+        with self._connect() as conn:
+            self._check_version(conn, conversation_id, expected_version)
+            conn.execute(
+                "INSERT INTO conversation_summaries (conversation_id, summary, covered, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(conversation_id) DO UPDATE SET "
+                "summary = excluded.summary, covered = excluded.covered, updated_at = excluded.updated_at",
+                (conversation_id, summary, covered, _now())
+            )
+
+    def delete(self, conversation_id: str, expected_version: int | None = None) -> bool:
+        """
+        Delete a conversation and its messages. Returns False if it was missing.
+
+        Raises:
+            ConflictError: If expected_version does not match
+        """
+        with self._connect() as conn:
+            self._check_version(conn, conversation_id, expected_version)
+            cur = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            return cur.rowcount > 0
+
+    @staticmethod
+    def _check_version(conn, conversation_id, expected_version):
+        """Raise ConflictError if the stored version differs from the expected one."""
+        if expected_version is None:
+            return
+        row = conn.execute(
+            "SELECT version FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        current = row['version'] if row else 0
+        if current != expected_version:
+            raise ConflictError(current)
+
+    def sync(self, conversations: dict) -> None:
+        """
+        Bring the store in line with a full conversations map.
+
+        Only the difference is written: new messages at the end of a
+        conversation are appended, titles are updated in place, and
+        conversations missing from the map are deleted. A conversation
+        whose stored history is longer than the posted one is rewritten.
+        """
+        with self._connect() as conn:
+            stored = {
+                row['id']: row
+                for row in conn.execute("SELECT id, title, message_count FROM conversations")
+            }
+            for conversation_id, convo in conversations.items():
+                messages = convo.get('messages', [])
+                title = convo.get('title', '')
+                row = stored.get(conversation_id)
+                if row is None:
+                    self._append(conn, conversation_id, messages, title, convo.get('created_at'))
+                    continue
+                if len(messages) < row['message_count']:
+                    conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+                    conn.execute(
+                        "DELETE FROM conversation_summaries WHERE conversation_id = ?",
+                        (conversation_id,)
+                    )
+                    conn.execute(
+                        "UPDATE conversations SET message_count = 0 WHERE id = ?",
+                        (conversation_id,)
+                    )
+                    self._append(conn, conversation_id, messages)
+                elif len(messages) > row['message_count']:
+                    self._append(conn, conversation_id, messages[row['message_count']:])
+                if title and title != row['title']:
+                    conn.execute(
+                        "UPDATE conversations SET title = ?, updated_at = ?, version = version + 1 "
+                        "WHERE id = ?",
+                        (title, _now(), conversation_id)
+                    )
+            removed = set(stored) - set(conversations)
+            conn.executemany(
+                "DELETE FROM conversations WHERE id = ?", [(cid,) for cid in removed]
+            )
+
+    def _append(self, conn, conversation_id, messages, title=None, created_at=None):
+        """Append messages inside an open transaction and return the new version."""
+        now = _now()
+        conn.execute(
+            "INSERT INTO conversations (id, title, created_at, updated_at, version) "
+            "VALUES (?, ?, ?, ?, 0) ON CONFLICT(id) DO NOTHING",
+            (conversation_id, (title or '')[:200], created_at or now, now)
+        )
+        count = conn.execute(
+            "SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()['message_count']
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, seq, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (conversation_id, count + i, msg.get('role', 'user'), msg.get('content', '') or '', now)
+                for i, msg in enumerate(messages)
+            ]
+        )
+        return conn.execute(
+            "UPDATE conversations SET message_count = message_count + ?, updated_at = ?, "
+            "version = version + 1 WHERE id = ? RETURNING version",
+            (len(messages), now, conversation_id)
+        ).fetchone()['version']
+
+
+def migrate_from_json(store: ConversationStore, json_path: str) -> int:
+    """
+    One-shot import of a legacy conversations.json file into the store.
+
+    The JSON file is renamed to ``<name>.migrated`` afterwards so the
+    import normally runs once. Conversations already in the store are
+    skipped, so running it again (a failed rename, a restored backup of
+    the file) doesn't duplicate their messages.
+
+    Args:
+        store: Destination store
+        json_path: Path to the legacy conversations.json
+
+    Returns:
+        Number of conversations imported
+    """
+    if not os.path.exists(json_path):
+        return 0
+
+    with open(json_path, 'r') as f:
+        conversations = json.load(f)
+
+    imported = 0
+    with store._connect() as conn:
+        existing = {row['id'] for row in conn.execute("SELECT id FROM conversations")}
+        for conversation_id, convo in conversations.items():
+            if conversation_id in existing:
+                continue
+            store._append(
+                conn, conversation_id, convo.get('messages', []),
+                convo.get('title', ''), convo.get('created_at')
+            )
+            imported += 1
+
+    os.replace(json_path, json_path + '.migrated')
+    return imported
+
+
+if __name__ == "__main__":
+    import sys
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_dir, 'conversations.json')
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, 'conversations.db')
+
+    count = migrate_from_json(ConversationStore(target), source)
+    print(f"Migrated {count} conversations from {source} to {target}")
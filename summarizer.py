@@ -0,0 +1,145 @@
+"""Rolling summaries of older conversation turns to keep prompts short."""
+
+import asyncio
+import os
+import time
+
+from main import remove_task_markers
+from ollama_pool import pool
+from scheduler import scheduler, QueueFullError, PRIORITY_BACKGROUND
+from storage import ConflictError
+
+# Off by default: summarizing costs an extra (background) generation
+SUMMARIZE_HISTORY = os.getenv("SUMMARIZE_HISTORY", "false").lower() == "true"
+
+# The most recent messages are always sent verbatim; older ones are folded
+# into the summary once at least SUMMARY_MIN_BATCH of them have piled up
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", 8))
+SUMMARY_MIN_BATCH = int(os.getenv("SUMMARY_MIN_BATCH", 6))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "")
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", 400))
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new messages below. Keep names, facts, preferences, decisions and open questions; drop small talk.
+Write at most a few short paragraphs in plain text, without any preamble.
+
+## Current summary:
+{summary}
+
+## New messages:
+{messages}"""
+
+
+class Summarizer:
+    """
+    Keeps a cached summary of each conversation's older messages.
+
+    The summary is refreshed in the background after messages are appended,
+    so answering a message never waits on it. Each refresh folds only the
+    messages that slid out of the recent window since the last refresh into
+    the previous summary.
+    """
+
+    def __init__(self, store, enabled: bool = SUMMARIZE_HISTORY):
+        """
+        Args:
+            store: ConversationStore holding messages and summaries
+            enabled: Whether summaries are produced and used
+        """
+        self.store = store
+        self.enabled = enabled
+        self._running = {}
+        self.refreshes = 0
+        self.failures = 0
+        self.discarded = 0
+        self.last_duration = 0.0
+
+    def summary_for(self, conversation_id):
+        """
+        Get a conversation's summary.
+
+        Returns:
+            Tuple of (summary, covered) where ``covered`` is how many leading
+            messages the summary replaces; ("", 0) when there is none
+        """
+        if not self.enabled or not conversation_id:
+            return "", 0
+        return self.store.get_summary(conversation_id) or ("", 0)
+
+    def schedule(self, conversation_id, model):
+        """Refresh a conversation's summary in the background if it is due."""
+        if not self.enabled or conversation_id in self._running:
+            return
+        task = asyncio.create_task(self._refresh(conversation_id, SUMMARY_MODEL or model))
+        self._running[conversation_id] = task
+        task.add_done_callback(lambda _: self._running.pop(conversation_id, None))
+
+    async def _refresh(self, conversation_id, model):
+        # Store calls run in worker threads so SQLite lock waits don't block the event loop
+        stored = await asyncio.to_thread(self.store.get_summary, conversation_id) or ("", 0)
+        summary, covered = stored
+        convo = await asyncio.to_thread(self.store.get, conversation_id, limit=0)
+        if convo is None:
+            return
+        cutoff = convo['message_count'] - SUMMARY_KEEP_RECENT
+        if cutoff - covered < SUMMARY_MIN_BATCH:
+            return
+
+        messages = (await asyncio.to_thread(
+            self.store.get, conversation_id, offset=covered, limit=cutoff - covered
+        ))['messages']
+        transcript = "\n\n".join(
+            f"{msg['role'].capitalize()}: {remove_task_markers(msg['content'])}" for msg in messages
+        )
+        started = time.monotonic()
+        try:
+            # Waits behind interactive requests for the model
+            async with scheduler.slot(model, PRIORITY_BACKGROUND):
+                response = await pool.acall(
+                    'chat',
+                    model=model,
+                    messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                        summary=summary or "(none yet)", messages=transcript
+                    )}],
+                    options={"num_predict": SUMMARY_MAX_TOKENS, "temperature": 0.2},
+                )
+            new_summary = response['message']['content'].strip()
+        except QueueFullError:
+            # Busy; the next append retries
+            return
+        except Exception as e:
+            self.failures += 1
+            print(f"Error summarizing conversation {conversation_id}: {e}")
+            return
+
+        if not new_summary:
+            return
+        try:
+            # Only stored if the conversation is still as it was read; a
+            # delete or a rewritten history in the meantime would leave a
+            # summary of messages that no longer exist
+            await asyncio.to_thread(
+                self.store.set_summary, conversation_id, new_summary, cutoff,
+                expected_version=convo['version']
+            )
+        except ConflictError:
+            # Changed while summarizing; the next append retries
+            self.discarded += 1
+            return
+        except Exception as e:
+            self.failures += 1
+            print(f"Error saving summary of conversation {conversation_id}: {e}")
+            return
+        self.refreshes += 1
+        self.last_duration = round(time.monotonic() - started, 3)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            'enabled': self.enabled,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'discarded': self.discarded,
+            'running': len(self._running),
+            'last_duration': self.last_duration,
+        }
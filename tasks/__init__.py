@@ -1,15 +1,19 @@
 """Task automation module for ChatFreeGPT."""
 
-from .base import TaskHandler, TaskResult
-from .youtube import YouTubeTask, find_first_video
+from .base import TaskHandler, TaskResult, TaskMarkerParser, execute_tasks
+from .youtube import YouTubeTask, find_first_video, find_first_video_async, video_cache
 from .gmail import GmailTask
 from .browser import BrowserTask, SearchTask
 
 __all__ = [
     'TaskHandler',
     'TaskResult',
+    'TaskMarkerParser',
+    'execute_tasks',
     'YouTubeTask',
     'find_first_video',
+    'find_first_video_async',
+    'video_cache',
     'GmailTask',
     'BrowserTask',
     'SearchTask',
@@ -1,5 +1,6 @@
 """Base task handler classes."""
 
+import asyncio
 import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
@@ -25,6 +26,15 @@ class TaskHandler(ABC):
         """Execute the task with given parameters."""
         pass
 
+    async def execute_async(self, params: str) -> TaskResult:
+        """
+        Execute the task without blocking the event loop.
+
+        Runs ``execute`` in a worker thread; handlers with a native async
+        implementation override this.
+        """
+        return await asyncio.to_thread(self.execute, params)
+
     @classmethod
     def parse_task_marker(cls, text: str) -> list[tuple[str, str]]:
         """
@@ -43,3 +53,130 @@ class TaskHandler(ABC):
         """Remove task markers from text for display."""
         pattern = r'\[TASK:\w+:[^\]]+\]'
         return re.sub(pattern, '', text).strip()
+
+
+async def execute_tasks(handlers: dict, tasks: list, timeout: float) -> list[TaskResult]:
+    """
+    Execute several tasks concurrently.
+
+    A task that is unknown, fails or takes longer than ``timeout`` seconds
+    gets an unsuccessful result; the others are unaffected.
+
+    Args:
+        handlers: Dict of task type -> TaskHandler
+        tasks: List of (task_type, params) tuples
+        timeout: Seconds each task may take
+
+    Returns:
+        List of TaskResult in the order of ``tasks``
+    """
+    async def run(task_type, params):
+        handler = handlers.get(task_type)
+        if handler is None:
+            return TaskResult(success=False, message=f"Unknown task type: {task_type}", task_type=task_type)
+        try:
+            return await asyncio.wait_for(handler.execute_async(params), timeout)
+        except asyncio.TimeoutError:
+            return TaskResult(success=False, message=f"Task timed out after {timeout:g}s", task_type=task_type)
+        except Exception as e:
+            return TaskResult(success=False, message=f"Task execution error: {e}", task_type=task_type)
+
+    return await asyncio.gather(*(run(task_type, params) for task_type, params in tasks))
+
+
+_WORD_CHAR = re.compile(r'\w')
+
+
+class TaskMarkerParser:
+    """
+    Incremental parser that strips task markers from streamed text.
+
+    Text is fed as it arrives. Anything that can no longer be part of a
+    marker is returned for display right away; a possible marker is held
+    back until it closes or turns out not to be one. Finds the same markers
+    as ``TaskHandler.parse_task_marker`` does on the complete text.
+    """
+
+    PREFIX = "[TASK:"
+
+    def __init__(self):
+        self._pending = []
+        self._length = 0
+        self._colon = -1
+
+    def feed(self, text: str) -> tuple[str, list[tuple[str, str, str, int]]]:
+        """
+        Parse the next piece of text.
+
+        Returns:
+            Tuple of (text to display, markers completed in this piece as
+            (task_type, params, raw_marker, offset) tuples, where ``offset``
+            is the marker's position in the returned text)
+        """
+        out = []
+        markers = []
+        self._scan(text, out, markers)
+        return "".join(out), markers
+
+    def flush(self) -> str:
+        """End of stream: return any held-back text, which never closed into a marker."""
+        text = "".join(self._pending)
+        self._reset()
+        return text
+
+    def _reset(self):
+        self._pending = []
+        self._length = 0
+        self._colon = -1
+
+    def _hold(self, text):
+        self._pending.append(text)
+        self._length += len(text)
+
+    def _scan(self, text, out, markers):
+        i = 0
+        while i < len(text):
+            if not self._length:
+                start = text.find('[', i)
+                if start == -1:
+                    out.append(text[i:])
+                    return
+                out.append(text[i:start])
+                self._hold('[')
+                i = start + 1
+                continue
+
+            if self._colon >= 0:
+                # Inside the params: everything up to the closing bracket
+                end = text.find(']', i)
+                if end == -1:
+                    self._hold(text[i:])
+                    return
+                if end > i or self._length > self._colon + 1:
+                    self._hold(text[i:end])
+                    raw = "".join(self._pending) + ']'
+                    offset = sum(len(piece) for piece in out)
+                    markers.append((raw[len(self.PREFIX):self._colon], raw[self._colon + 1:-1], raw, offset))
+                    self._reset()
+                    i = end + 1
+                    continue
+                ok = False
+            elif self._length < len(self.PREFIX):
+                ok = text[i] == self.PREFIX[self._length]
+            elif text[i] == ':' and self._length > len(self.PREFIX):
+                self._colon = self._length
+                ok = True
+            else:
+                ok = bool(_WORD_CHAR.match(text[i]))
+
+            char = text[i]
+            i += 1
+            if ok:
+                self._hold(char)
+                continue
+            # Not a marker after all: its '[' is plain text, and a marker
+            # may still start later in what was held back
+            held = "".join(self._pending)[1:] + char
+            self._reset()
+            out.append('[')
+            self._scan(held, out, markers)
@@ -1,38 +1,186 @@
 """YouTube task handler."""
 
+import asyncio
+import os
 import urllib.parse
-import urllib.request
 import re
+import httpx
+from cache import TTLCache
 from .base import TaskHandler, TaskResult
 
+VIDEO_ID_PATTERN = re.compile(r'/watch\?v=([a-zA-Z0-9_-]{11})')
+
+# Longest possible match, kept from the end of one chunk to the next so an
+# ID split across chunk boundaries is still found
+_MATCH_OVERLAP = len('/watch?v=') + 11
+
+# Resolved videos are cached for an hour; "no video found" for five minutes
+video_cache = TTLCache(
+    maxsize=int(os.getenv("VIDEO_CACHE_SIZE", 512)),
+    ttl=float(os.getenv("VIDEO_CACHE_TTL", 3600)),
+)
+VIDEO_NEGATIVE_TTL = float(os.getenv("VIDEO_NEGATIVE_TTL", 300))
+_NOT_FOUND = object()
+
+_HTTP_OPTIONS = dict(
+    headers={"User-Agent": "Mozilla/5.0"}, timeout=8, follow_redirects=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=8),
+)
+_http = httpx.Client(**_HTTP_OPTIONS)
+_async_http = None
+_inflight = {}
+# How many callers are waiting on each in-flight fetch
+_waiters = {}
+
+
+def _video_result(video_id: str) -> dict:
+    return {
+        "videoId": video_id,
+        "videoUrl": f"https://www.youtube.com/watch?v={video_id}",
+    }
+
+
+def _search_url(query: str) -> str:
+    return f"https://www.youtube.com/results?search_query={urllib.parse.quote(query)}"
+
+
+def _cache_key(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def _cached(key: str):
+    """Return a copy of the cached result (None for a cached miss), or _NOT_FOUND."""
+    cached = video_cache.get(key, _NOT_FOUND)
+    if cached is _NOT_FOUND or cached is None:
+        return cached
+    return dict(cached)
+
+
+def _remember(key: str, result: dict | None) -> dict | None:
+    video_cache.set(key, result, ttl=None if result else VIDEO_NEGATIVE_TTL)
+    return dict(result) if result else None
+
+
+class _VideoIdScanner:
+    """Incrementally scan decoded page text for the first video ID."""
+
+    def __init__(self):
+        self._tail = ""
+
+    def feed(self, text: str) -> str | None:
+        window = self._tail + text
+        match = VIDEO_ID_PATTERN.search(window)
+        if match:
+            return match.group(1)
+        self._tail = window[-_MATCH_OVERLAP:]
+        return None
+
 
 def find_first_video(query: str) -> dict | None:
-    """Search YouTube and return the first video result's ID and URL."""
+    """
+    Search YouTube and return the first video result's ID and URL.
+
+    Results (including misses) are cached, and the results page is read
+    only until the first video ID appears.
+    """
+    key = _cache_key(query)
+    cached = _cached(key)
+    if cached is not _NOT_FOUND:
+        return cached
+
     try:
-        encoded = urllib.parse.quote(query)
-        url = f"https://www.youtube.com/results?search_query={encoded}"
-        req = urllib.request.Request(
-            url, headers={"User-Agent": "Mozilla/5.0"}
-        )
-        resp = urllib.request.urlopen(req, timeout=8)
-        html = resp.read().decode("utf-8")
-        match = re.search(r'/watch\?v=([a-zA-Z0-9_-]{11})', html)
-        if match:
-            video_id = match.group(1)
-            return {
-                "videoId": video_id,
-                "videoUrl": f"https://www.youtube.com/watch?v={video_id}",
-            }
+        scanner = _VideoIdScanner()
+        with _http.stream("GET", _search_url(query)) as resp:
+            for text in resp.iter_text():
+                video_id = scanner.feed(text)
+                if video_id:
+                    return _remember(key, _video_result(video_id))
+        return _remember(key, None)
     except Exception:
         pass
     return None
 
 
+async def _fetch_first_video(key: str, query: str) -> dict | None:
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(**_HTTP_OPTIONS)
+    try:
+        scanner = _VideoIdScanner()
+        async with _async_http.stream("GET", _search_url(query)) as resp:
+            async for text in resp.aiter_text():
+                video_id = scanner.feed(text)
+                if video_id:
+                    return _remember(key, _video_result(video_id))
+        return _remember(key, None)
+    except Exception:
+        pass
+    return None
+
+
+async def find_first_video_async(query: str) -> dict | None:
+    """
+    Async variant of :func:`find_first_video`; concurrent lookups of one query share a request.
+
+    Cancelling one lookup leaves the request running for the others; when
+    the last one waiting is cancelled, the request is cancelled too.
+    """
+    key = _cache_key(query)
+    cached = _cached(key)
+    if cached is not _NOT_FOUND:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_first_video(key, query))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    _waiters[task] = _waiters.get(task, 0) + 1
+    try:
+        result = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if _waiters[task] == 1:
+            task.cancel()
+        raise
+    finally:
+        _waiters[task] -= 1
+        if not _waiters[task]:
+            del _waiters[task]
+    return dict(result) if result else None
+
+
 class YouTubeTask(TaskHandler):
     """Handler for YouTube video playback tasks."""
 
     task_type = "youtube"
 
+    def _is_url(self, params: str) -> bool:
+        return params.startswith(('http://', 'https://', 'www.'))
+
+    def _result(self, params: str, video: dict | None) -> TaskResult:
+        """Playback result for a URL, a found video, or a search results page."""
+        if self._is_url(params):
+            url = params if params.startswith('http') else f'https://{params}'
+        else:
+            url = video["videoUrl"] if video else None
+            if not url:
+                query = urllib.parse.quote(params)
+                url = f"https://www.youtube.com/results?search_query={query}"
+
+        return TaskResult(
+            success=True,
+            message=f"Playing on YouTube: {params}",
+            url=url,
+            task_type=self.task_type
+        )
+
+    def _error(self, e: Exception) -> TaskResult:
+        return TaskResult(
+            success=False,
+            message=f"Failed to find YouTube video: {str(e)}",
+            task_type=self.task_type
+        )
+
     def execute(self, params: str) -> TaskResult:
         """
         Search YouTube and return the first matching video URL.
@@ -44,25 +192,15 @@ class YouTubeTask(TaskHandler):
             TaskResult with the video URL for the frontend to open
         """
         try:
-            if params.startswith(('http://', 'https://', 'www.')):
-                url = params if params.startswith('http') else f'https://{params}'
-            else:
-                result = find_first_video(params)
-                url = result["videoUrl"] if result else None
-                if not url:
-                    query = urllib.parse.quote(params)
-                    url = f"https://www.youtube.com/results?search_query={query}"
-
-            return TaskResult(
-                success=True,
-                message=f"Playing on YouTube: {params}",
-                url=url,
-                task_type=self.task_type
-            )
+            video = None if self._is_url(params) else find_first_video(params)
+            return self._result(params, video)
+        except Exception as e:
+            return self._error(e)
 
+    async def execute_async(self, params: str) -> TaskResult:
+        """Async variant of :meth:`execute`; shares in-flight lookups of the same query."""
+        try:
+            video = None if self._is_url(params) else await find_first_video_async(params)
+            return self._result(params, video)
         except Exception as e:
-            return TaskResult(
-                success=False,
-                message=f"Failed to find YouTube video: {str(e)}",
-                task_type=self.task_type
-            )
+            return self._error(e)